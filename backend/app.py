@@ -1,24 +1,74 @@
-from flask import Flask, request, jsonify, send_from_directory
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Blueprint, Flask, current_app, request, jsonify, send_from_directory, stream_with_context, g
 from flask_cors import CORS
+from werkzeug.utils import safe_join
+from sqlalchemy.exc import IntegrityError, StatementError
+from sqlalchemy.orm import load_only
 from config import Config
-from models import db, Admin, Achievement, Initiative, Workshop, Alumni, Project, BlogPost, ForumCategory, ForumPost, ForumReply
+from models import db, add_missing_columns, add_missing_indexes, Admin, Job, Achievement, Initiative, Workshop, Alumni, Project, BlogPost, ForumCategory, ForumPost, ForumReply
 from functools import wraps
+import auth
+import batch
+import cache
+import compression
+import database
+import search
+import serializers
+import snapshots
+import transfer
+import listings
+import live
+import pagination
+import ratelimit
+import replicas
+import metrics
+import images
+import jobs
+import resumable
 import os
+import mimetypes
 import jwt
-import datetime
-
-app = Flask(__name__)
-app.config.from_object(Config)
-CORS(app, resources={r"/api/*": {
-    "origins": "*",
-    "allow_headers": ["Content-Type", "Authorization"],
-    "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
-}})
-
-db.init_app(app)
 
-# Create uploads folder
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Every route lives on this blueprint; create_app() builds an app around it.
+# Creating an app is cheap: the schema and default rows are set up once by
+# init_db (`flask --app app init-db`, or gunicorn's on_starting hook), not per worker.
+bp = Blueprint('site', __name__)
+
+def create_app(config=Config):
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.json = serializers.JSONProvider(app)
+    CORS(app, resources={r"/api/*": {
+        "origins": "*",
+        "allow_headers": ["Content-Type", "Authorization", "Content-Range", "X-Chunk-Checksum", "X-Consistency-Token"],
+        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        "expose_headers": ["X-Next-Cursor", "X-Consistency-Token"]
+    }})
+
+    db.init_app(app)
+    database.init_app(app, db)
+    cache.init_app(app)
+    # Registered before compression so its after_request hook sees the final body size
+    metrics.init_app(app, db)
+    compression.init_app(app)
+    auth.init_app(app)
+    ratelimit.init_app(app)
+    snapshots.init_app(app)
+    replicas.init_app(app)
+    app.register_blueprint(bp)
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        init_db(app)
+
+    # Create uploads folder
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    jobs.init_app(app)
+    metrics.record_startup(app, IMPORT_SECONDS, time.perf_counter() - started)
+    return app
 
 # JWT token required decorator
 def token_required(f):
@@ -34,10 +84,8 @@ def token_required(f):
             return jsonify({'success': False, 'message': 'Token is missing'}), 401
 
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_admin = Admin.query.get(data['admin_id'])
-            if not current_admin:
-                return jsonify({'success': False, 'message': 'Invalid token'}), 401
+            # Decoded once here; handlers read the principal from g
+            g.principal = auth.verify_token(token, current_app.config['SECRET_KEY'])
         except jwt.ExpiredSignatureError:
             return jsonify({'success': False, 'message': 'Token has expired'}), 401
         except jwt.InvalidTokenError:
@@ -46,10 +94,27 @@ def token_required(f):
         return f(*args, **kwargs)
     return decorated
 
-# Initialize database and create default admin
-def init_db():
+# Optional ?fields=a,b / ?exclude=c projection for list responses
+def requested_fields():
+    fields = request.args.get('fields')
+    exclude = request.args.get('exclude')
+    fields = set(f for f in fields.split(',') if f) if fields else None
+    exclude = set(f for f in exclude.split(',') if f) if exclude else set()
+    return fields, exclude
+
+def json_response(obj):
+    # For rows from a model Serializer: encoded straight to bytes, datetimes included
+    return current_app.response_class(serializers.dumps(obj), mimetype='application/json')
+
+# Create and migrate the schema, the default admin and forum categories.
+# Run once per deploy before workers start; safe to repeat.
+def init_db(app):
     with app.app_context():
         db.create_all()
+        add_missing_columns()
+        add_missing_indexes()
+        cache.ensure_versions()
+        search.init_search_index()
         # Remove old admin user if exists
         old_admin = Admin.query.filter_by(username='admin').first()
         if old_admin:
@@ -74,48 +139,76 @@ def init_db():
             db.session.add_all(categories)
             db.session.commit()
 
+        if app.config['SNAPSHOT_DIR']:
+            snapshots.write_snapshots()
+
 # ============ AUTH ROUTES ============
-@app.route('/api/auth/login', methods=['POST'])
+@bp.route('/api/auth/login', methods=['POST'])
+@ratelimit.limited
 def login():
     data = request.get_json()
     admin = Admin.query.filter_by(username=data.get('username')).first()
     if admin and admin.check_password(data.get('password')):
-        token = jwt.encode({
-            'admin_id': admin.id,
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(days=7)
-        }, app.config['SECRET_KEY'], algorithm='HS256')
+        token = auth.issue_token(admin, current_app.config['SECRET_KEY'])
         return jsonify({'success': True, 'token': token, 'message': 'Logged in successfully'})
     return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
 
-@app.route('/api/auth/logout', methods=['POST'])
+@bp.route('/api/auth/logout', methods=['POST'])
 def logout():
     return jsonify({'success': True, 'message': 'Logged out successfully'})
 
-@app.route('/api/auth/check', methods=['GET'])
+@bp.route('/api/auth/check', methods=['GET'])
 @token_required
 def check_auth():
     return jsonify({'authenticated': True})
 
-@app.route('/api/auth/change-password', methods=['POST'])
+@bp.route('/api/auth/change-password', methods=['POST'])
 @token_required
 def change_password():
     data = request.get_json()
-    token = request.headers['Authorization'].split(' ')[1]
-    token_data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-    admin = Admin.query.get(token_data['admin_id'])
+    admin = db.session.get(Admin, g.principal['admin_id'])
     if admin.check_password(data.get('current_password')):
         admin.set_password(data.get('new_password'))
+        # Sign out every other session; the caller continues with the new token
+        auth.revoke_tokens(admin)
         db.session.commit()
-        return jsonify({'success': True, 'message': 'Password changed successfully'})
+        token = auth.issue_token(admin, current_app.config['SECRET_KEY'])
+        return jsonify({'success': True, 'token': token, 'message': 'Password changed successfully'})
     return jsonify({'success': False, 'message': 'Current password is incorrect'}), 400
 
+def paginate(query, model):
+    limit = request.args.get('limit', pagination.DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, pagination.MAX_PAGE_SIZE))
+    return pagination.page(query, model, limit, request.args.get('cursor'))
+
+def page_response(items, next_cursor):
+    response = json_response(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+# ============ HOME ROUTE ============
+@bp.route('/api/home', methods=['GET'])
+@replicas.read_only
+@cache.cached(Achievement, Initiative, Workshop, Alumni)
+def get_home():
+    # Everything the landing page needs in one request instead of four
+    fields, exclude = requested_fields()
+    return json_response({
+        'achievements': Achievement.serializer.rows(listings.achievements(db.session), fields, exclude),
+        'initiatives': Initiative.serializer.rows(listings.initiatives(db.session), fields, exclude),
+        'workshops': Workshop.serializer.rows(listings.workshops(db.session), fields, exclude),
+        'alumni': Alumni.serializer.rows(listings.alumni(db.session), fields, exclude)
+    })
+
 # ============ ACHIEVEMENTS ROUTES ============
-@app.route('/api/achievements', methods=['GET'])
+@bp.route('/api/achievements', methods=['GET'])
+@replicas.read_only
+@cache.cached(Achievement)
 def get_achievements():
-    achievements = Achievement.query.order_by(Achievement.order, Achievement.date.desc()).all()
-    return jsonify([a.to_dict() for a in achievements])
+    return json_response(Achievement.serializer.rows(listings.achievements(db.session), *requested_fields()))
 
-@app.route('/api/achievements', methods=['POST'])
+@bp.route('/api/achievements', methods=['POST'])
 @token_required
 def create_achievement():
     data = request.get_json()
@@ -129,7 +222,7 @@ def create_achievement():
     db.session.commit()
     return jsonify(achievement.to_dict()), 201
 
-@app.route('/api/achievements/<int:id>', methods=['PUT'])
+@bp.route('/api/achievements/<int:id>', methods=['PUT'])
 @token_required
 def update_achievement(id):
     achievement = Achievement.query.get_or_404(id)
@@ -141,7 +234,7 @@ def update_achievement(id):
     db.session.commit()
     return jsonify(achievement.to_dict())
 
-@app.route('/api/achievements/<int:id>', methods=['DELETE'])
+@bp.route('/api/achievements/<int:id>', methods=['DELETE'])
 @token_required
 def delete_achievement(id):
     achievement = Achievement.query.get_or_404(id)
@@ -150,12 +243,13 @@ def delete_achievement(id):
     return jsonify({'success': True})
 
 # ============ INITIATIVES ROUTES ============
-@app.route('/api/initiatives', methods=['GET'])
+@bp.route('/api/initiatives', methods=['GET'])
+@replicas.read_only
+@cache.cached(Initiative)
 def get_initiatives():
-    initiatives = Initiative.query.order_by(Initiative.order).all()
-    return jsonify([i.to_dict() for i in initiatives])
+    return json_response(Initiative.serializer.rows(listings.initiatives(db.session), *requested_fields()))
 
-@app.route('/api/initiatives', methods=['POST'])
+@bp.route('/api/initiatives', methods=['POST'])
 @token_required
 def create_initiative():
     data = request.get_json()
@@ -170,7 +264,7 @@ def create_initiative():
     db.session.commit()
     return jsonify(initiative.to_dict()), 201
 
-@app.route('/api/initiatives/<int:id>', methods=['PUT'])
+@bp.route('/api/initiatives/<int:id>', methods=['PUT'])
 @token_required
 def update_initiative(id):
     initiative = Initiative.query.get_or_404(id)
@@ -183,7 +277,7 @@ def update_initiative(id):
     db.session.commit()
     return jsonify(initiative.to_dict())
 
-@app.route('/api/initiatives/<int:id>', methods=['DELETE'])
+@bp.route('/api/initiatives/<int:id>', methods=['DELETE'])
 @token_required
 def delete_initiative(id):
     initiative = Initiative.query.get_or_404(id)
@@ -192,12 +286,13 @@ def delete_initiative(id):
     return jsonify({'success': True})
 
 # ============ WORKSHOPS ROUTES ============
-@app.route('/api/workshops', methods=['GET'])
+@bp.route('/api/workshops', methods=['GET'])
+@replicas.read_only
+@cache.cached(Workshop)
 def get_workshops():
-    workshops = Workshop.query.order_by(Workshop.order, Workshop.date.desc()).all()
-    return jsonify([w.to_dict() for w in workshops])
+    return json_response(Workshop.serializer.rows(listings.workshops(db.session), *requested_fields()))
 
-@app.route('/api/workshops', methods=['POST'])
+@bp.route('/api/workshops', methods=['POST'])
 @token_required
 def create_workshop():
     data = request.get_json()
@@ -212,7 +307,7 @@ def create_workshop():
     db.session.commit()
     return jsonify(workshop.to_dict()), 201
 
-@app.route('/api/workshops/<int:id>', methods=['PUT'])
+@bp.route('/api/workshops/<int:id>', methods=['PUT'])
 @token_required
 def update_workshop(id):
     workshop = Workshop.query.get_or_404(id)
@@ -225,7 +320,7 @@ def update_workshop(id):
     db.session.commit()
     return jsonify(workshop.to_dict())
 
-@app.route('/api/workshops/<int:id>', methods=['DELETE'])
+@bp.route('/api/workshops/<int:id>', methods=['DELETE'])
 @token_required
 def delete_workshop(id):
     workshop = Workshop.query.get_or_404(id)
@@ -234,12 +329,13 @@ def delete_workshop(id):
     return jsonify({'success': True})
 
 # ============ ALUMNI ROUTES ============
-@app.route('/api/alumni', methods=['GET'])
+@bp.route('/api/alumni', methods=['GET'])
+@replicas.read_only
+@cache.cached(Alumni)
 def get_alumni():
-    alumni = Alumni.query.order_by(Alumni.order).all()
-    return jsonify([a.to_dict() for a in alumni])
+    return json_response(Alumni.serializer.rows(listings.alumni(db.session), *requested_fields()))
 
-@app.route('/api/alumni', methods=['POST'])
+@bp.route('/api/alumni', methods=['POST'])
 @token_required
 def create_alumni():
     data = request.get_json()
@@ -256,7 +352,7 @@ def create_alumni():
     db.session.commit()
     return jsonify(alumni.to_dict()), 201
 
-@app.route('/api/alumni/<int:id>', methods=['PUT'])
+@bp.route('/api/alumni/<int:id>', methods=['PUT'])
 @token_required
 def update_alumni(id):
     alumni = Alumni.query.get_or_404(id)
@@ -271,7 +367,7 @@ def update_alumni(id):
     db.session.commit()
     return jsonify(alumni.to_dict())
 
-@app.route('/api/alumni/<int:id>', methods=['DELETE'])
+@bp.route('/api/alumni/<int:id>', methods=['DELETE'])
 @token_required
 def delete_alumni(id):
     alumni = Alumni.query.get_or_404(id)
@@ -280,12 +376,13 @@ def delete_alumni(id):
     return jsonify({'success': True})
 
 # ============ PROJECTS ROUTES ============
-@app.route('/api/projects', methods=['GET'])
+@bp.route('/api/projects', methods=['GET'])
+@replicas.read_only
+@cache.cached(Project)
 def get_projects():
-    projects = Project.query.order_by(Project.order, Project.created_at.desc()).all()
-    return jsonify([p.to_dict() for p in projects])
+    return json_response(Project.serializer.rows(listings.projects(db.session), *requested_fields()))
 
-@app.route('/api/projects', methods=['POST'])
+@bp.route('/api/projects', methods=['POST'])
 @token_required
 def create_project():
     data = request.get_json()
@@ -302,7 +399,7 @@ def create_project():
     db.session.commit()
     return jsonify(project.to_dict()), 201
 
-@app.route('/api/projects/<int:id>', methods=['PUT'])
+@bp.route('/api/projects/<int:id>', methods=['PUT'])
 @token_required
 def update_project(id):
     project = Project.query.get_or_404(id)
@@ -317,7 +414,7 @@ def update_project(id):
     db.session.commit()
     return jsonify(project.to_dict())
 
-@app.route('/api/projects/<int:id>', methods=['DELETE'])
+@bp.route('/api/projects/<int:id>', methods=['DELETE'])
 @token_required
 def delete_project(id):
     project = Project.query.get_or_404(id)
@@ -326,21 +423,25 @@ def delete_project(id):
     return jsonify({'success': True})
 
 # ============ BLOG ROUTES ============
-@app.route('/api/blog', methods=['GET'])
+@bp.route('/api/blog', methods=['GET'])
+@replicas.read_only
+@cache.cached(BlogPost)
 def get_blog_posts():
-    published_only = request.args.get('published', 'true') == 'true'
-    query = BlogPost.query
-    if published_only:
-        query = query.filter_by(published=True)
-    posts = query.order_by(BlogPost.created_at.desc()).all()
-    return jsonify([p.to_dict() for p in posts])
-
-@app.route('/api/blog/<int:id>', methods=['GET'])
+    query = listings.blog_summaries(db.session, request.args.get('published', 'true') == 'true')
+    try:
+        posts, next_cursor = paginate(query, BlogPost)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return page_response(BlogPost.summary_serializer.rows(posts, *requested_fields()), next_cursor)
+
+@bp.route('/api/blog/<int:id>', methods=['GET'])
+@replicas.read_only
+@cache.cached(BlogPost)
 def get_blog_post(id):
     post = BlogPost.query.get_or_404(id)
     return jsonify(post.to_dict())
 
-@app.route('/api/blog', methods=['POST'])
+@bp.route('/api/blog', methods=['POST'])
 @token_required
 def create_blog_post():
     data = request.get_json()
@@ -356,7 +457,7 @@ def create_blog_post():
     db.session.commit()
     return jsonify(post.to_dict()), 201
 
-@app.route('/api/blog/<int:id>', methods=['PUT'])
+@bp.route('/api/blog/<int:id>', methods=['PUT'])
 @token_required
 def update_blog_post(id):
     post = BlogPost.query.get_or_404(id)
@@ -370,7 +471,7 @@ def update_blog_post(id):
     db.session.commit()
     return jsonify(post.to_dict())
 
-@app.route('/api/blog/<int:id>', methods=['DELETE'])
+@bp.route('/api/blog/<int:id>', methods=['DELETE'])
 @token_required
 def delete_blog_post(id):
     post = BlogPost.query.get_or_404(id)
@@ -379,12 +480,14 @@ def delete_blog_post(id):
     return jsonify({'success': True})
 
 # ============ FORUM ROUTES ============
-@app.route('/api/forum/categories', methods=['GET'])
+@bp.route('/api/forum/categories', methods=['GET'])
+@replicas.read_only
+@cache.cached(ForumCategory, ForumPost)
 def get_forum_categories():
     categories = ForumCategory.query.order_by(ForumCategory.order).all()
-    return jsonify([c.to_dict() for c in categories])
+    return json_response(ForumCategory.serializer.rows(categories, *requested_fields()))
 
-@app.route('/api/forum/categories', methods=['POST'])
+@bp.route('/api/forum/categories', methods=['POST'])
 @token_required
 def create_forum_category():
     data = request.get_json()
@@ -397,16 +500,23 @@ def create_forum_category():
     db.session.commit()
     return jsonify(category.to_dict()), 201
 
-@app.route('/api/forum/posts', methods=['GET'])
+@bp.route('/api/forum/posts', methods=['GET'])
+@replicas.read_only
+@cache.cached(ForumPost, ForumReply, ForumCategory)
 def get_forum_posts():
     category_id = request.args.get('category_id')
-    query = ForumPost.query
+    query = ForumPost.query.options(load_only(*[getattr(ForumPost, c) for c in ForumPost.SUMMARY_COLUMNS]))
     if category_id:
         query = query.filter_by(category_id=category_id)
-    posts = query.order_by(ForumPost.created_at.desc()).all()
-    return jsonify([p.to_dict() for p in posts])
-
-@app.route('/api/forum/posts/<int:id>', methods=['GET'])
+    try:
+        posts, next_cursor = paginate(query, ForumPost)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return page_response(ForumPost.summary_serializer.rows(posts, *requested_fields()), next_cursor)
+
+@bp.route('/api/forum/posts/<int:id>', methods=['GET'])
+@replicas.read_only
+@cache.cached(ForumPost, ForumReply, ForumCategory)
 def get_forum_post(id):
     post = ForumPost.query.get_or_404(id)
     return jsonify({
@@ -414,7 +524,8 @@ def get_forum_post(id):
         'replies': [r.to_dict() for r in post.replies]
     })
 
-@app.route('/api/forum/posts', methods=['POST'])
+@bp.route('/api/forum/posts', methods=['POST'])
+@ratelimit.limited
 def create_forum_post():
     data = request.get_json()
     post = ForumPost(
@@ -425,10 +536,15 @@ def create_forum_post():
         category_id=data.get('category_id')
     )
     db.session.add(post)
+    db.session.flush()
+    summary = post.to_summary_dict()
+    live.publish('forum', 'post', summary)
+    if post.category_id:
+        live.publish('category:%d' % post.category_id, 'post', summary)
     db.session.commit()
     return jsonify(post.to_dict()), 201
 
-@app.route('/api/forum/posts/<int:id>', methods=['DELETE'])
+@bp.route('/api/forum/posts/<int:id>', methods=['DELETE'])
 @token_required
 def delete_forum_post(id):
     post = ForumPost.query.get_or_404(id)
@@ -436,7 +552,8 @@ def delete_forum_post(id):
     db.session.commit()
     return jsonify({'success': True})
 
-@app.route('/api/forum/posts/<int:post_id>/replies', methods=['POST'])
+@bp.route('/api/forum/posts/<int:post_id>/replies', methods=['POST'])
+@ratelimit.limited
 def create_forum_reply(post_id):
     post = ForumPost.query.get_or_404(post_id)
     data = request.get_json()
@@ -447,10 +564,25 @@ def create_forum_reply(post_id):
         post_id=post_id
     )
     db.session.add(reply)
+    db.session.flush()
+    live.publish('post:%d' % post_id, 'reply', reply.to_dict())
     db.session.commit()
     return jsonify(reply.to_dict()), 201
 
-@app.route('/api/forum/replies/<int:id>', methods=['DELETE'])
+# Live updates: each stream pushes only what was created after the client's Last-Event-ID
+@bp.route('/api/forum/stream', methods=['GET'])
+def stream_forum():
+    return live.stream('forum')
+
+@bp.route('/api/forum/categories/<int:id>/stream', methods=['GET'])
+def stream_forum_category(id):
+    return live.stream('category:%d' % id)
+
+@bp.route('/api/forum/posts/<int:id>/stream', methods=['GET'])
+def stream_forum_post(id):
+    return live.stream('post:%d' % id)
+
+@bp.route('/api/forum/replies/<int:id>', methods=['DELETE'])
 @token_required
 def delete_forum_reply(id):
     reply = ForumReply.query.get_or_404(id)
@@ -458,8 +590,25 @@ def delete_forum_reply(id):
     db.session.commit()
     return jsonify({'success': True})
 
+# ============ SEARCH ROUTES ============
+@bp.route('/api/search', methods=['GET'])
+@replicas.read_only
+def search_content():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search query is required'}), 400
+    page = request.args.get('page', 1, type=int)
+    limit = request.args.get('limit', search.DEFAULT_PAGE_SIZE, type=int)
+    results, has_more, truncated = search.search(query, page, limit)
+    return jsonify({
+        'results': results,
+        'page': page,
+        'next_page': page + 1 if has_more else None,
+        'truncated': truncated
+    })
+
 # ============ FILE UPLOAD ============
-@app.route('/api/upload', methods=['POST'])
+@bp.route('/api/upload', methods=['POST'])
 @token_required
 def upload_file():
     if 'file' not in request.files:
@@ -469,25 +618,191 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
 
-    from werkzeug.utils import secure_filename
-    filename = secure_filename(file.filename)
+    filename = images.save_upload(file, current_app.config['UPLOAD_FOLDER'])
+    manifest = images.schedule(current_app._get_current_object(), filename) if images.is_image(filename) else None
+
+    return jsonify({'url': f'/uploads/{filename}', 'filename': filename, 'manifest': manifest})
 
-    import time
-    filename = f"{int(time.time())}_{filename}"
+# Chunked uploads for large files (event videos, CAD): create a session, PUT each
+# chunk with Content-Range, GET the session to find the offset after a disconnect,
+# then POST /complete, which queues a job to verify and store the file
+def upload_error(error):
+    body = {'error': error.message}
+    if error.offset is not None:
+        body['offset'] = error.offset
+    return jsonify(body), error.status
+
+@bp.route('/api/upload/sessions', methods=['POST'])
+@token_required
+def create_upload_session():
+    data = request.get_json()
+    try:
+        session = resumable.create_session(current_app.config['UPLOAD_FOLDER'], data.get('filename'), data.get('size'),
+                                           data.get('checksum'), current_app.config['MAX_UPLOAD_SIZE'])
+    except resumable.UploadError as e:
+        return upload_error(e)
+    return jsonify({**session, 'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE']}), 201
+
+@bp.route('/api/upload/sessions/<session_id>', methods=['GET'])
+@token_required
+def get_upload_session(session_id):
+    try:
+        return jsonify(resumable.load_session(current_app.config['UPLOAD_FOLDER'], session_id))
+    except resumable.UploadError as e:
+        return upload_error(e)
 
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
+@bp.route('/api/upload/sessions/<session_id>', methods=['PUT'])
+@token_required
+def upload_chunk(session_id):
+    try:
+        session = resumable.write_chunk(current_app.config['UPLOAD_FOLDER'], session_id, request.stream,
+                                        request.headers.get('Content-Range'),
+                                        request.headers.get('X-Chunk-Checksum'))
+    except resumable.UploadError as e:
+        return upload_error(e)
+    return jsonify(session)
+
+@bp.route('/api/upload/sessions/<session_id>/complete', methods=['POST'])
+@token_required
+def complete_upload_session(session_id):
+    # Hashing a file of up to MAX_UPLOAD_SIZE runs on the job queue; poll /api/jobs/<id>
+    try:
+        resumable.complete_session(current_app.config['UPLOAD_FOLDER'], session_id)
+    except resumable.UploadError as e:
+        return upload_error(e)
+    job = jobs.enqueue('complete_upload', {'session_id': session_id}, priority=10)
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Verifying upload', 'job': job.to_dict()}), 202
 
-    return jsonify({'url': f'/uploads/{filename}', 'filename': filename})
+UPLOAD_MAX_AGE = 365 * 24 * 60 * 60
+MUTABLE_UPLOAD_MAX_AGE = 300
 
-@app.route('/uploads/<filename>')
+@bp.route('/uploads/<filename>')
 def serve_upload(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    folder = current_app.config['UPLOAD_FOLDER']
+    # Content-addressed files never change; manifests do, so they are always revalidated
+    if images.is_content_addressed(filename):
+        max_age = UPLOAD_MAX_AGE
+    elif filename.endswith('.json'):
+        max_age = None
+    else:
+        max_age = MUTABLE_UPLOAD_MAX_AGE
+
+    if current_app.config['UPLOAD_OFFLOAD'] == 'x-accel':
+        # nginx streams the file from its internal location; Python never reads it
+        path = safe_join(folder, filename)
+        if path is None or not os.path.isfile(path):
+            return jsonify({'error': 'File not found'}), 404
+        response = current_app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = current_app.config['UPLOAD_ACCEL_PREFIX'] + filename
+        if max_age is None:
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.max_age = max_age
+    else:
+        # send_file answers Range / If-Range itself (and emits X-Sendfile when USE_X_SENDFILE is on)
+        response = send_from_directory(folder, filename, max_age=max_age)
+
+    if max_age is not None:
+        response.cache_control.public = True
+    if max_age == UPLOAD_MAX_AGE:
+        response.cache_control.immutable = True
+    return response
+
+# ============ BATCH MUTATIONS ============
+# Fields accepted for each resource, matching the individual create/update handlers
+BATCH_RESOURCES = {
+    'achievements': (Achievement, ('title', 'description', 'image', 'order')),
+    'initiatives': (Initiative, ('title', 'description', 'image', 'status', 'order')),
+    'workshops': (Workshop, ('title', 'description', 'image', 'location', 'order')),
+    'alumni': (Alumni, ('name', 'department', 'batch', 'image', 'current_position', 'linkedin', 'order')),
+    'projects': (Project, ('title', 'description', 'image', 'status', 'github', 'demo', 'order')),
+    'blog': (BlogPost, ('title', 'content', 'excerpt', 'image', 'author', 'published')),
+}
+
+@bp.route('/api/<resource>/batch', methods=['POST'])
+@token_required
+def batch_mutate(resource):
+    if resource not in BATCH_RESOURCES:
+        return jsonify({'success': False, 'message': 'Unknown resource'}), 404
+    model, fields = BATCH_RESOURCES[resource]
+    data = request.get_json()
+    try:
+        results = batch.apply(model, fields, data.get('ops'))
+        db.session.commit()
+    except batch.BatchError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': e.message, 'results': e.results}), 400
+    except (IntegrityError, StatementError) as e:
+        # A constraint validate() doesn't model; the bulk statement can't say which op broke it
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Batch rejected by the database: %s' % e.orig}), 400
+    return jsonify({'success': True, 'results': results})
+
+# ============ EXPORT / IMPORT ============
+@bp.route('/api/export', methods=['GET'])
+@token_required
+def export_content():
+    response = current_app.response_class(stream_with_context(transfer.export_lines()), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = 'attachment; filename=robosust-content.ndjson'
+    return response
+
+@bp.route('/api/import', methods=['POST'])
+@token_required
+def import_content():
+    # Streamed line by line, so a backup may be larger than MAX_CONTENT_LENGTH
+    request.max_content_length = current_app.config['MAX_UPLOAD_SIZE']
+    try:
+        counts = transfer.import_lines(request.stream)
+    except transfer.TransferError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': e.message}), 400
+    db.session.commit()
+    return jsonify({'success': True, 'imported': counts})
+
+# ============ DATABASE STATS ============
+@bp.route('/api/stats/db', methods=['GET'])
+@token_required
+def database_stats():
+    return jsonify({'dialect': db.engine.dialect.name, 'pool': database.stats(db)})
+
+# ============ METRICS ============
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != 'Bearer ' + token:
+        return jsonify({'success': False, 'message': 'Invalid token'}), 401
+    return current_app.response_class(metrics.render(current_app, db), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# ============ BACKGROUND JOBS ============
+@bp.route('/api/jobs/<int:id>', methods=['GET'])
+@token_required
+def get_job(id):
+    return jsonify(Job.query.get_or_404(id).to_dict())
+
+@jobs.task('process_image')
+def process_image_job(filename):
+    images.process_image(current_app._get_current_object(), filename)
+
+@jobs.task('complete_upload', max_attempts=1)
+def complete_upload_job(session_id):
+    # A checksum mismatch deletes the session, so there is nothing to retry
+    app = current_app._get_current_object()
+    filename = resumable.finish_session(app.config['UPLOAD_FOLDER'], session_id)
+    manifest = images.schedule(app, filename) if images.is_image(filename) else None
+    return {'url': f'/uploads/{filename}', 'filename': filename, 'manifest': manifest}
 
 # ============ SEED DATA ============
-@app.route('/api/seed', methods=['POST'])
+@bp.route('/api/seed', methods=['POST'])
 @token_required
 def seed_data():
+    # Runs on the job queue; poll /api/jobs/<id> for the outcome
+    job = jobs.enqueue('seed')
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Seeding queued', 'job': job.to_dict()}), 202
+
+@jobs.task('seed')
+def seed_content():
     achievements_data = [
         {'title': 'NASA Space Apps Challenge 2024', 'description': 'Team EcoQuest secured notable position with innovative environmental monitoring solution.', 'image': '/assets/images/work/NasaSpaceApp.jpg'},
         {'title': 'BUET Chemical Fest 2024', 'description': 'Team showcased exceptional performance in the ChemiCar segment at BUET Chemical Fest 2024.', 'image': '/assets/images/work/Ghorar_gari.jpg'},
@@ -496,18 +811,14 @@ def seed_data():
         {'title': 'BRAC IEEE Satellite Expedition', 'description': 'Team Ethereal Luminary participated in BRAC University IEEE Satellite competition.', 'image': '/assets/images/work/Comsot.jpg'},
         {'title': 'KUET LFR Champion', 'description': 'Team SUST Mavericks emerged as champions in the Line Follower Robot segment.', 'image': '/assets/images/work/KUET-2.jpg'}
     ]
-    for i, data in enumerate(achievements_data):
-        if not Achievement.query.filter_by(title=data['title']).first():
-            db.session.add(Achievement(order=i, **data))
+    transfer.upsert_rows(Achievement, 'title', [{'order': i, **data} for i, data in enumerate(achievements_data)], update_existing=False)
 
     initiatives_data = [
         {'title': 'Automama', 'description': "Bangladesh's first Level 2 autonomous car project.", 'image': '/assets/images/home/automama.png', 'status': 'ongoing'},
         {'title': 'Orca', 'description': 'Autonomous Underwater Vehicle (AUV) for underwater exploration.', 'image': '/assets/images/home/orca.png', 'status': 'ongoing'},
         {'title': 'ChemiCar', 'description': 'Custom battery powered car with color sensor stopping mechanism.', 'image': '/assets/images/home/chemicar.png', 'status': 'ongoing'}
     ]
-    for i, data in enumerate(initiatives_data):
-        if not Initiative.query.filter_by(title=data['title']).first():
-            db.session.add(Initiative(order=i, **data))
+    transfer.upsert_rows(Initiative, 'title', [{'order': i, **data} for i, data in enumerate(initiatives_data)], update_existing=False)
 
     workshops_data = [
         {'title': 'AI Awareness Workshop', 'description': 'AI awareness workshop in JSPSC', 'image': '/assets/images/workshop/1.jpg'},
@@ -517,9 +828,7 @@ def seed_data():
         {'title': 'IoT Workshop', 'description': 'Internet of Things fundamentals', 'image': '/assets/images/workshop/5.jpg'},
         {'title': 'Machine Learning Seminar', 'description': 'Introduction to ML for robotics', 'image': '/assets/images/workshop/6.jpg'}
     ]
-    for i, data in enumerate(workshops_data):
-        if not Workshop.query.filter_by(title=data['title']).first():
-            db.session.add(Workshop(order=i, **data))
+    transfer.upsert_rows(Workshop, 'title', [{'order': i, **data} for i, data in enumerate(workshops_data)], update_existing=False)
 
     alumni_data = [
         {'name': 'Noushad Sojib', 'department': 'CSE', 'batch': '2009-10', 'image': '/assets/images/home/members/Nowshad.png'},
@@ -529,24 +838,30 @@ def seed_data():
         {'name': 'Ali Tarique Zaman', 'department': 'CEE', 'batch': '2015-16', 'image': '/assets/images/home/members/Ali Tarique Zaman.png'},
         {'name': 'Anamul Haque', 'department': 'MEE', 'batch': '2016-17', 'image': '/assets/images/home/members/Anamul.png'}
     ]
-    for i, data in enumerate(alumni_data):
-        if not Alumni.query.filter_by(name=data['name']).first():
-            db.session.add(Alumni(order=i, **data))
+    transfer.upsert_rows(Alumni, 'name', [{'order': i, **data} for i, data in enumerate(alumni_data)], update_existing=False)
 
     projects_data = [
         {'title': 'Sign Language Recognition System', 'description': 'IoT-based system that recognizes sign language gestures.', 'image': '/assets/images/project/1.jpg', 'status': 'completed'},
         {'title': 'Autonomous Water Vehicle', 'description': 'Self-navigating water vehicle with collision avoidance.', 'image': '/assets/images/project/2.jpg', 'status': 'ongoing'},
         {'title': 'Ribo - Social Humanoid Robot', 'description': "Bangladesh's first social humanoid robot that speaks Bengali.", 'image': '/assets/images/home/intro-1.jpeg', 'status': 'completed'}
     ]
-    for i, data in enumerate(projects_data):
-        if not Project.query.filter_by(title=data['title']).first():
-            db.session.add(Project(order=i, **data))
+    transfer.upsert_rows(Project, 'title', [{'order': i, **data} for i, data in enumerate(projects_data)], update_existing=False)
 
     db.session.commit()
-    return jsonify({'success': True, 'message': 'Data seeded successfully'})
 
-# Always run init_db so gunicorn also initializes the database
-init_db()
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+def __getattr__(name):
+    # `gunicorn app:app` and other older entry points get an app built on first
+    # access, which under gunicorn happens in each worker after the fork
+    if name == 'app':
+        app = globals()['app'] = create_app()
+        return app
+    raise AttributeError(name)
 
 if __name__ == '__main__':
+    # Development server: one process, so set up the database here
+    app = create_app()
+    init_db(app)
+    metrics.clear_directory(app.config['METRICS_DIR'])
     app.run(debug=True, port=5000)
@@ -0,0 +1,10 @@
+import os
+from a2wsgi import WSGIMiddleware
+
+from app import create_app
+
+# ASGI entry point, e.g. `uvicorn asgi:app --workers 2` or
+# `gunicorn -k uvicorn.workers.UvicornWorker asgi:app`. Requests run the Flask app
+# on a pool of ASGI_THREADS threads per process, so each still gets its own
+# app context and session, and an open stream holds one thread like under gthread.
+app = WSGIMiddleware(create_app(), workers=int(os.environ.get('ASGI_THREADS', 10)))
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+import datetime
+import threading
+import time
+import uuid
+import jwt
+from models import db, Admin
+
+# Verified-principal cache for token_required. The JWT signature and expiry are
+# checked on every request; the Admin lookup that confirms the account still
+# exists and the token's version is current is cached per token id for
+# AUTH_CACHE_TTL seconds. Changing a password bumps Admin.token_version, which
+# revokes older tokens immediately in this worker and within the TTL elsewhere.
+TOKEN_LIFETIME = datetime.timedelta(days=7)
+
+class PrincipalCache:
+    def __init__(self, ttl=60, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, principal = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def set(self, key, principal):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke(self, admin_id):
+        with self._lock:
+            for key in [k for k, (_, p) in self._entries.items() if p['admin_id'] == admin_id]:
+                del self._entries[key]
+
+principal_cache = PrincipalCache()
+
+def init_app(app):
+    principal_cache.ttl = app.config.get('AUTH_CACHE_TTL', 60)
+
+def issue_token(admin, secret):
+    return jwt.encode({
+        'admin_id': admin.id,
+        'ver': admin.token_version,
+        'jti': uuid.uuid4().hex,
+        'exp': datetime.datetime.utcnow() + TOKEN_LIFETIME
+    }, secret, algorithm='HS256')
+
+def verify_token(token, secret):
+    # Returns the principal dict or raises jwt.InvalidTokenError (incl. ExpiredSignatureError)
+    data = jwt.decode(token, secret, algorithms=['HS256'])
+    # Tokens issued before jti was added are keyed by their signature instead
+    key = data.get('jti') or token.rsplit('.', 1)[-1]
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+
+    admin = db.session.get(Admin, data['admin_id'])
+    if not admin or admin.token_version != data.get('ver', 0):
+        raise jwt.InvalidTokenError('Token has been revoked')
+    principal = {'admin_id': admin.id, 'username': admin.username, 'ver': admin.token_version, 'jti': key}
+    principal_cache.set(key, principal)
+    return principal
+
+def revoke_tokens(admin):
+    admin.token_version += 1
+    principal_cache.revoke(admin.id)
@@ -0,0 +1,108 @@
+import cache
+import search
+import snapshots
+from models import db
+
+# Mixed create/update/delete operations against one model, applied with bulk
+# statements in a single transaction. The whole batch is validated before any
+# write, so it either applies completely or not at all. Ops are applied grouped,
+# not in request order: all creates, then all updates, then all deletes.
+CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+MAX_OPS = 1000
+TYPE_NAMES = {str: 'a string', int: 'an integer', bool: 'true or false', float: 'a number'}
+
+class BatchError(Exception):
+    def __init__(self, message, results=None):
+        super().__init__(message)
+        self.message = message
+        self.results = results
+
+def required_fields(model, fields):
+    # Columns that must be supplied on create: NOT NULL without any default
+    return [name for name in fields
+            if not model.__table__.c[name].nullable
+            and model.__table__.c[name].default is None
+            and model.__table__.c[name].server_default is None]
+
+def field_errors(model, fields, data):
+    # NOT NULL and Python type checks for the supplied fields, so bad values are
+    # reported per op instead of failing the bulk statement
+    errors = []
+    for name in fields:
+        if name not in data:
+            continue
+        column, value = model.__table__.c[name], data[name]
+        if value is None:
+            if not column.nullable:
+                errors.append('%s cannot be null' % name)
+            continue
+        try:
+            expected = column.type.python_type
+        except NotImplementedError:
+            continue
+        # bool is an int subclass; neither may stand in for the other
+        if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+            errors.append('%s must be %s' % (name, TYPE_NAMES.get(expected, expected.__name__)))
+    return errors
+
+def validate(model, fields, ops):
+    if not isinstance(ops, list) or not ops:
+        raise BatchError('ops must be a non-empty list')
+    if len(ops) > MAX_OPS:
+        raise BatchError('A batch may contain at most %d ops' % MAX_OPS)
+
+    required = required_fields(model, fields)
+    ids = {op.get('id') for op in ops
+           if isinstance(op, dict) and op.get('op') in (UPDATE, DELETE) and isinstance(op.get('id'), int)}
+    existing = {row_id for (row_id,) in db.session.query(model.id).filter(model.id.in_(ids))} if ids else set()
+
+    results = []
+    for index, op in enumerate(ops):
+        error = None
+        kind = op.get('op') if isinstance(op, dict) else None
+        data = op.get('data', {}) if isinstance(op, dict) else None
+        if kind not in (CREATE, UPDATE, DELETE):
+            error = 'op must be create, update or delete'
+        elif not isinstance(data, dict):
+            error = 'data must be an object'
+        elif kind == CREATE:
+            missing = [name for name in required if data.get(name) in (None, '')]
+            if missing:
+                error = 'Missing required fields: %s' % ', '.join(missing)
+        elif op.get('id') not in existing:
+            error = 'No %s with id %r' % (model.__tablename__, op.get('id'))
+        if error is None and kind != DELETE:
+            error = '; '.join(field_errors(model, fields, data)) or None
+        results.append({'index': index, 'op': kind, 'id': op.get('id') if kind != CREATE else None,
+                        'success': error is None, **({'error': error} if error else {})})
+    if any(not r['success'] for r in results):
+        raise BatchError('Batch rejected; no changes were made', results)
+    return results
+
+def apply(model, fields, ops):
+    # Returns per-op results; the caller commits
+    results = validate(model, fields, ops)
+
+    creates = [{name: op['data'][name] for name in fields if name in op['data']}
+               for op in ops if op['op'] == CREATE]
+    updates = [{'id': op['id'], **{name: op['data'][name] for name in fields if name in op.get('data', {})}}
+               for op in ops if op['op'] == UPDATE]
+    deletes = [op['id'] for op in ops if op['op'] == DELETE]
+
+    if creates:
+        db.session.bulk_insert_mappings(model, creates, return_defaults=True)
+        created_ids = iter(row['id'] for row in creates)
+        for result in results:
+            if result['op'] == CREATE:
+                result['id'] = next(created_ids)
+    if updates:
+        db.session.bulk_update_mappings(model, [u for u in updates if len(u) > 1])
+    if deletes:
+        db.session.query(model).filter(model.id.in_(deletes)).delete(synchronize_session=False)
+
+    # Bulk statements skip the flush hooks, so bump versions and reindex explicitly
+    changed = [row['id'] for row in creates] + [u['id'] for u in updates] + deletes
+    cache.touch_tables(db.session, {model.__tablename__})
+    search.reindex(db.session, model, changed)
+    snapshots.mark_posts(db.session, model, changed)
+    return results
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_app(database_url=None):
+    # Build the Flask app against a throwaway database so benchmarks never touch real data
+    if database_url is None:
+        workdir = tempfile.mkdtemp(prefix='robosust-bench-')
+        database_url = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['DATABASE_URL'] = database_url
+    # Benchmarks post far faster than any real client
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    # Job threads would run their own statements in the middle of the measurements
+    os.environ.setdefault('JOB_THREADS', '0')
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from app import create_app, init_db
+    app = create_app()
+    init_db(app)
+    return app
+
+def admin_headers(client):
+    res = client.post('/api/auth/login', json={'username': 'robosust2026', 'password': 'robosust2077'})
+    return {'Authorization': 'Bearer ' + res.get_json()['token']}
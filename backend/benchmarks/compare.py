@@ -0,0 +1,62 @@
+"""Compare two load.py result files and flag regressions.
+
+    python benchmarks/compare.py baseline.json candidate.json [--threshold 10]
+
+Exits 1 if any route's p95 latency grew, or its throughput fell, by more than
+--threshold percent, or if it returned errors the baseline did not.
+"""
+import argparse
+import json
+import sys
+
+def change(old, new):
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed regression in percent')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline.get('settings') != candidate.get('settings'):
+        print('warning: runs used different settings: %s vs %s' % (baseline.get('settings'), candidate.get('settings')))
+
+    print('%s -> %s' % (baseline.get('commit'), candidate.get('commit')))
+    print('%-44s %10s %10s %8s %10s %10s %8s' % ('route', 'p95 ms', 'p95 ms', 'change', 'req/s', 'req/s', 'change'))
+    regressions = []
+    for route, new in candidate['routes'].items():
+        old = baseline['routes'].get(route)
+        if old is None:
+            print('%-44s %10s %10.2f' % (route[:44], 'new', new['p95_ms']))
+            continue
+        latency = change(old['p95_ms'], new['p95_ms'])
+        throughput = change(old['throughput_rps'], new['throughput_rps'])
+        flags = []
+        if latency is not None and latency > args.threshold:
+            flags.append('p95 +%.0f%%' % latency)
+        if throughput is not None and -throughput > args.threshold:
+            flags.append('throughput %.0f%%' % throughput)
+        if new['errors'] > old['errors']:
+            flags.append('%d errors' % new['errors'])
+        if flags:
+            regressions.append((route, flags))
+        print('%-44s %10.2f %10.2f %7.1f%% %10.1f %10.1f %7.1f%% %s' % (
+            route[:44], old['p95_ms'], new['p95_ms'], latency or 0, old['throughput_rps'],
+            new['throughput_rps'], throughput or 0, 'REGRESSION' if flags else ''))
+
+    if regressions:
+        print('\n%d route(s) regressed beyond %.0f%%:' % (len(regressions), args.threshold))
+        for route, flags in regressions:
+            print('  %s: %s' % (route, ', '.join(flags)))
+        sys.exit(1)
+    print('\nNo regressions beyond %.0f%%' % args.threshold)
+
+if __name__ == '__main__':
+    main()
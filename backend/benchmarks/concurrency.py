@@ -0,0 +1,126 @@
+"""Measure how many long-lived connections each serving mode can hold.
+
+    python benchmarks/concurrency.py [--modes sync,gthread,gevent,asgi] [--workers 2] [--max-streams 256]
+
+Starts the app once per mode with the same number of worker processes and
+opens forum SSE streams in growing steps, keeping earlier ones open. After each
+step a normal request (/api/forum/categories) is timed; the capacity of a mode
+is the most open streams at which every stream was accepted and that request
+still answered within --probe-timeout. Each mode also gets a short throughput
+run of the same route at --concurrency.
+"""
+import argparse
+import http.client
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from common import load_app
+import load
+
+def server_command(mode, port, workers):
+    if mode == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                '--workers', str(workers), '--log-level', 'warning']
+    return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', '--bind', '127.0.0.1:%d' % port,
+            '--workers', str(workers), 'app:create_app()']
+
+def available(mode):
+    modules = {'gevent': ['gevent'], 'asgi': ['uvicorn', 'a2wsgi']}.get(mode, [])
+    return all(importlib.util.find_spec(module) is not None for module in modules)
+
+def open_stream(port, timeout):
+    # Returns the open connection once the server has started answering, else None
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('GET', '/api/forum/stream')
+        response = conn.getresponse()
+        if response.status == 200 and response.fp.readline():
+            return conn
+    except (OSError, http.client.HTTPException):
+        pass
+    conn.close()
+    return None
+
+def probe(port, timeout):
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('GET', '/api/forum/categories')
+        response = conn.getresponse()
+        response.read()
+        return (time.perf_counter() - start) * 1000 if response.status == 200 else None
+    except (OSError, http.client.HTTPException):
+        return None
+    finally:
+        conn.close()
+
+def measure(mode, database_url, args):
+    port = load.free_port()
+    server = load.start_server(database_url, port, args.workers, command=server_command(mode, port, args.workers),
+                               extra_env={'GUNICORN_WORKER_CLASS': mode if mode != 'asgi' else 'sync',
+                                          'STREAM_DURATION': '600',
+                                          # Hold every stream open, as if polling were unavailable
+                                          'LIVE_STREAMS': 'sse', 'STREAM_MAX_PER_WORKER': '100000'})
+    streams, steps, capacity = [], [], 0
+    try:
+        throughput = load.run_route(port, '/api/forum/categories', args.requests, args.concurrency, {})
+        level = 1
+        while level <= args.max_streams:
+            wanted = level - len(streams)
+            with ThreadPoolExecutor(max_workers=min(wanted, 64)) as pool:
+                opened = list(pool.map(lambda _: open_stream(port, args.probe_timeout), range(wanted)))
+            streams += [conn for conn in opened if conn]
+            latency = probe(port, args.probe_timeout)
+            ok = len(streams) == level and latency is not None
+            steps.append((level, len(streams), latency))
+            print('  %-8s streams %4d/%-4d probe %s' % (mode, len(streams), level,
+                                                       '%.1f ms' % latency if latency is not None else 'timed out'))
+            if not ok:
+                break
+            capacity = level
+            level *= 2
+    finally:
+        for conn in streams:
+            conn.close()
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()  # uvicorn waits for open streams to finish
+            server.wait()
+    return {'capacity': capacity, 'steps': steps, 'throughput_rps': throughput['throughput_rps'],
+            'p95_ms': throughput['p95_ms'], 'errors': throughput['errors']}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='sync,gthread,gevent,asgi')
+    parser.add_argument('--workers', type=int, default=2, help='processes per mode (the old config ran 2 sync workers)')
+    parser.add_argument('--max-streams', type=int, default=256)
+    parser.add_argument('--probe-timeout', type=float, default=3.0)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='robosust-concurrency-'), 'bench.db')
+    load_app(database_url)
+
+    results = {}
+    for mode in args.modes.split(','):
+        if not available(mode):
+            print('%s: skipped, its server package is not installed' % mode)
+            continue
+        print('%s:' % mode)
+        results[mode] = measure(mode, database_url, args)
+
+    print('\n%-8s %16s %10s %10s %7s' % ('mode', 'open streams', 'req/s', 'p95 ms', 'errors'))
+    for mode, result in results.items():
+        print('%-8s %16s %10.1f %10.2f %7d' % (mode, '%d+' % result['capacity'] if result['capacity'] >= args.max_streams
+                                               else result['capacity'], result['throughput_rps'], result['p95_ms'],
+                                               result['errors']))
+
+if __name__ == '__main__':
+    main()
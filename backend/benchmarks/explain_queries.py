@@ -0,0 +1,129 @@
+"""Check that every listing route's queries are served by an index.
+
+    python benchmarks/explain_queries.py [--database-url postgresql://...]
+
+Calls each public listing route, captures the SELECTs it runs and prints their
+EXPLAIN plans. Exits non-zero if a query scans a whole table and then sorts it
+in a temporary B-tree (SQLite) or a Sort node above a Seq Scan (Postgres), or
+if a correlated subquery scans a table once per row.
+"""
+import argparse
+import sys
+from sqlalchemy import event
+from common import load_app, admin_headers
+
+ROUTES = [
+    '/api/home',
+    '/api/achievements',
+    '/api/initiatives',
+    '/api/workshops',
+    '/api/alumni',
+    '/api/projects',
+    '/api/blog',
+    '/api/blog?published=false',
+    '/api/blog?limit=2&cursor={blog_cursor}',
+    '/api/forum/categories',
+    '/api/forum/posts',
+    '/api/forum/posts?category_id={category_id}',
+    '/api/forum/posts?limit=2&cursor={forum_cursor}',
+    '/api/forum/posts/{post_id}',
+]
+
+def seed(app, client):
+    from app import seed_content
+
+    # /api/seed only queues a job, and no job worker runs here
+    with app.app_context():
+        seed_content()
+    headers = admin_headers(client)
+    for i in range(5):
+        client.post('/api/blog', headers=headers, json={'title': 'Post %d' % i, 'content': 'Body', 'published': i % 2 == 0})
+    category_id = client.get('/api/forum/categories').get_json()[0]['id']
+    for i in range(5):
+        post = client.post('/api/forum/posts', json={'title': 'Thread %d' % i, 'content': 'Body',
+                                                     'author_name': 'bench', 'category_id': category_id}).get_json()
+        client.post('/api/forum/posts/%d/replies' % post['id'], json={'content': 'Reply', 'author_name': 'bench'})
+    return {
+        'category_id': category_id,
+        'post_id': post['id'],
+        'blog_cursor': client.get('/api/blog?published=false&limit=2').headers['X-Next-Cursor'],
+        'forum_cursor': client.get('/api/forum/posts?limit=2').headers['X-Next-Cursor'],
+    }
+
+def capture_selects(engine, client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'search_index' not in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return response.status_code, statements
+
+def explain(conn, statement, parameters):
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        return [row[-1] for row in rows]
+    # Tiny tables always seq scan on Postgres; ask whether an index *could* be used
+    conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    return [row[0] for row in conn.exec_driver_sql('EXPLAIN ' + statement, parameters).all()]
+
+def problems(plan, dialect):
+    found = []
+    if dialect == 'sqlite':
+        scans = [line for line in plan if line.startswith('SCAN') and 'INDEX' not in line]
+        if scans and any('TEMP B-TREE' in line for line in plan):
+            found.append('full scan + temp sort: %s' % ', '.join(scans))
+        in_subquery = False
+        for line in plan:
+            if 'CORRELATED' in line:
+                in_subquery = True
+            elif in_subquery and line.startswith('SCAN') and 'INDEX' not in line:
+                found.append('correlated subquery scans a table: %s' % line)
+    else:
+        text = '\n'.join(plan)
+        if 'Seq Scan' in text and 'Sort' in text:
+            found.append('seq scan + sort')
+        if 'SubPlan' in text and 'Seq Scan' in text:
+            found.append('subplan uses a seq scan')
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    app = load_app(args.database_url)
+    from models import db
+    import cache
+    client = app.test_client()
+    values = seed(app, client)
+
+    failures = 0
+    with app.app_context():
+        engine = db.engine
+        for route in ROUTES:
+            url = route.format(**values)
+            # Clear the response cache so the route actually queries
+            cache.response_cache.clear()
+            status, statements = capture_selects(engine, client, url)
+            print('%s (%d)' % (url, status))
+            for statement, parameters in statements:
+                with engine.connect() as conn:
+                    plan = explain(conn, statement, parameters)
+                found = problems(plan, engine.dialect.name)
+                failures += len(found)
+                print('  %s %s' % ('FAIL' if found else 'ok  ', ' '.join(statement.split())[:100]))
+                for line in plan:
+                    print('       ' + line)
+                for problem in found:
+                    print('    -> ' + problem)
+    print('%d problem(s)' % failures)
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
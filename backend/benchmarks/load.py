@@ -0,0 +1,209 @@
+"""Load-test every public route against the app running under gunicorn.
+
+    python benchmarks/load.py [--database-url URL] [--requests 500] [--concurrency 8] [--output results.json]
+
+Without --database-url a temporary SQLite database is seeded at benchmark scale
+(see seed.py). gunicorn is started with gunicorn_config.py on a free local
+port; each route gets a short warmup and then --requests requests from
+--concurrency client threads. Prints p50/p95/p99 latency, throughput and the
+server's RSS per route and writes them to a JSON file for compare.py.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from common import BACKEND_DIR, load_app
+import seed as seeder
+
+ROUTES = [
+    '/api/home',
+    '/api/achievements',
+    '/api/initiatives',
+    '/api/workshops',
+    '/api/alumni',
+    '/api/projects',
+    '/api/blog',
+    '/api/blog?published=false&limit=100',
+    '/api/blog/{blog_id}',
+    '/api/forum/categories',
+    '/api/forum/posts',
+    '/api/forum/posts?category_id={category_id}',
+    '/api/forum/posts/{post_id}',
+    '/api/search?q=robot+sensor',
+]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def get(port, path, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.request('GET', path, headers=headers or {})
+        response = conn.getresponse()
+        body = response.read()
+        return response.status, body, dict(response.getheaders())
+    finally:
+        conn.close()
+
+def start_server(database_url, port, workers, extra_env=None, command=None):
+    env = dict(os.environ, DATABASE_URL=database_url,
+               METRICS_DIR=tempfile.mkdtemp(prefix='robosust-bench-metrics-'), **(extra_env or {}))
+    if command is None:
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', '--bind', '127.0.0.1:%d' % port]
+        if workers:
+            command += ['--workers', str(workers)]
+        command += ['app:create_app()']
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if get(port, '/api/forum/categories')[0] == 200:
+                return server
+        except OSError:
+            pass
+        if server.poll() is not None:
+            raise RuntimeError('server exited with status %d' % server.returncode)
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('server did not start within 60s')
+
+def process_tree(pid):
+    # gunicorn master plus its workers
+    pids = [pid]
+    try:
+        for task in os.listdir('/proc/%d/task' % pid):
+            with open('/proc/%d/task/%s/children' % (pid, task)) as f:
+                pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    return pids
+
+def rss_mb(pid):
+    # Sum of VmRSS across the server's processes (Linux only)
+    total = 0
+    for p in process_tree(pid):
+        try:
+            with open('/proc/%d/status' % p) as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+    return round(total / 1024, 1)
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_route(port, path, requests, concurrency, headers):
+    latencies, errors, sizes = [], [0], []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                status, body, _ = get(port, path, headers)
+            except OSError:
+                status, body = None, b''
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                sizes.append(len(body))
+                if status != 200:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'response_bytes': sizes[-1] if sizes else 0,
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='already seeded database; default: seed a temporary SQLite file')
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, help='override the gunicorn worker count')
+    parser.add_argument('--gzip', action='store_true', help='send Accept-Encoding: gzip, br')
+    parser.add_argument('--output', default='benchmark-results.json')
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='robosust-load-'), 'bench.db')
+        print('Seeding %s ...' % database_url)
+        seeder.seed(load_app(database_url))
+
+    port = free_port()
+    server = start_server(database_url, port, args.workers)
+    headers = {'Accept-Encoding': 'gzip, br'} if args.gzip else {}
+    try:
+        values = {
+            'blog_id': json.loads(get(port, '/api/blog?limit=1')[1])[0]['id'],
+            'category_id': json.loads(get(port, '/api/forum/categories')[1])[0]['id'],
+            'post_id': json.loads(get(port, '/api/forum/posts?limit=1')[1])[0]['id'],
+        }
+        results = {}
+        print('%-44s %8s %8s %8s %8s %8s %7s' % ('route', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'RSS MB', 'errors'))
+        for route in ROUTES:
+            path = route.format(**values)
+            run_route(port, path, max(args.requests // 10, args.concurrency), args.concurrency, headers)  # warmup
+            result = run_route(port, path, args.requests, args.concurrency, headers)
+            result['rss_mb'] = rss_mb(server.pid)
+            results[route] = result
+            print('%-44s %8.2f %8.2f %8.2f %8.1f %8s %7d' % (route[:44], result['p50_ms'], result['p95_ms'],
+                                                            result['p99_ms'], result['throughput_rps'],
+                                                            result['rss_mb'], result['errors']))
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'settings': {'requests': args.requests, 'concurrency': args.concurrency, 'workers': args.workers,
+                     'gzip': args.gzip, 'database': database_url.split(':', 1)[0]},
+        'routes': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Wrote %s' % args.output)
+
+if __name__ == '__main__':
+    main()
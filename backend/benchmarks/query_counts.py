@@ -0,0 +1,113 @@
+"""Check that listing routes run a fixed number of SQL statements.
+
+    python benchmarks/query_counts.py [--database-url postgresql://...]
+
+Counts the statements each public listing route executes (with the response
+cache cleared) after seeding a few rows per table, then again after seeding
+several times more. Exits non-zero if a route goes over its QUERY_BUDGET or if
+its count grows with the number of rows, which is what an N+1 lazy load (a
+forum post's category name or reply count loaded per row) looks like.
+"""
+import argparse
+import sys
+from sqlalchemy import event
+from common import load_app, admin_headers
+
+# Route -> most statements it may run: one for the content versions, then the route's own queries
+QUERY_BUDGET = {
+    '/api/home': 5,
+    '/api/achievements': 2,
+    '/api/initiatives': 2,
+    '/api/workshops': 2,
+    '/api/alumni': 2,
+    '/api/projects': 2,
+    '/api/blog': 2,
+    '/api/blog?published=false': 2,
+    '/api/forum/categories': 2,
+    '/api/forum/posts': 2,
+    '/api/forum/posts?category_id={category_id}': 2,
+    '/api/forum/posts/{post_id}': 3,
+}
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA')
+CONTENT = {
+    '/achievements': {'title': 'Award', 'description': 'Won'},
+    '/initiatives': {'title': 'Initiative', 'description': 'Ongoing'},
+    '/workshops': {'title': 'Workshop', 'description': 'Hands-on'},
+    '/alumni': {'name': 'Alumnus', 'department': 'EEE', 'batch': '2019'},
+    '/projects': {'title': 'Project', 'description': 'Robot'},
+}
+
+def seed(client, count):
+    headers = admin_headers(client)
+    for path, data in CONTENT.items():
+        for i in range(count):
+            client.post('/api' + path, headers=headers, json=data)
+    for i in range(count):
+        client.post('/api/blog', headers=headers, json={'title': 'Post %d' % i, 'content': 'Body',
+                                                        'published': i % 2 == 0})
+    categories = client.get('/api/forum/categories').get_json()
+    for i in range(count):
+        category_id = categories[i % len(categories)]['id']
+        post = client.post('/api/forum/posts', json={'title': 'Thread %d' % i, 'content': 'Body',
+                                                     'author_name': 'bench', 'category_id': category_id}).get_json()
+        for j in range(i % 3 + 1):
+            client.post('/api/forum/posts/%d/replies' % post['id'], json={'content': 'Reply', 'author_name': 'bench'})
+    return {'category_id': categories[0]['id'], 'post_id': post['id']}
+
+def count_statements(engine, client, url):
+    import cache
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(TRANSACTION_CONTROL):
+            statements.append(statement)
+
+    # Clear the response cache so the route actually queries
+    cache.response_cache.clear()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return response.status_code, len(statements)
+
+def measure(app, client, values):
+    from models import db
+
+    with app.app_context():
+        engine = db.engine
+    return {route: count_statements(engine, client, route.format(**values)) for route in QUERY_BUDGET}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--small', type=int, default=3, help='rows per table for the first count')
+    parser.add_argument('--large', type=int, default=15, help='rows per table for the second count')
+    args = parser.parse_args()
+
+    app = load_app(args.database_url)
+    client = app.test_client()
+    small = measure(app, client, seed(client, args.small))
+    values = seed(client, args.large - args.small)
+    large = measure(app, client, values)
+
+    failures = 0
+    print('%-48s %6s %6s %6s' % ('route', 'small', 'large', 'budget'))
+    for route, budget in QUERY_BUDGET.items():
+        (small_status, small_count), (large_status, large_count) = small[route], large[route]
+        problems = []
+        if small_status != 200 or large_status != 200:
+            problems.append('status %d/%d' % (small_status, large_status))
+        if large_count > small_count:
+            problems.append('grows with rows')
+        if large_count > budget:
+            problems.append('over budget')
+        failures += bool(problems)
+        print('%-48s %6d %6d %6d  %s' % (route, small_count, large_count, budget,
+                                         'FAIL ' + ', '.join(problems) if problems else 'ok'))
+    print('%d route(s) failed' % failures)
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
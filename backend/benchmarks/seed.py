@@ -0,0 +1,105 @@
+"""Fill a database with synthetic content at benchmark scale.
+
+    python benchmarks/seed.py --database-url sqlite:////tmp/bench.db [--blog-posts 10000] [--forum-replies 100000]
+
+Rows are generated deterministically (fixed random seed), so two runs at the
+same scale produce the same data and load results can be compared.
+"""
+import argparse
+import datetime
+import random
+import time
+from common import load_app
+
+BATCH_SIZE = 2000
+WORDS = ('robot sensor arduino motor servo pcb design workshop team competition autonomous vehicle '
+         'drone camera vision learning controller battery circuit firmware underwater rover arm').split()
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+def paragraphs(rng, count):
+    return '\n\n'.join(sentence(rng, 60) + '.' for _ in range(count))
+
+def insert(db, model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.bulk_insert_mappings(model, rows[start:start + BATCH_SIZE])
+
+def seed(app, blog_posts=10000, forum_posts=5000, forum_replies=100000, items=200, seed_value=1):
+    # Returns {table: rows inserted}
+    from models import db, Achievement, Initiative, Workshop, Alumni, Project, BlogPost, ForumCategory, ForumPost, ForumReply
+    import cache
+    import search
+
+    rng = random.Random(seed_value)
+
+    def moment(i):
+        return datetime.datetime(2020, 1, 1) + datetime.timedelta(minutes=37 * i)
+
+    counts = {}
+    with app.app_context():
+        simple = [
+            (Achievement, lambda i: {'title': 'Achievement %d' % i, 'description': paragraphs(rng, 1),
+                                     'image': '/assets/images/workshop/%d.jpg' % (i % 6 + 1), 'date': moment(i), 'order': i % 10}),
+            (Initiative, lambda i: {'title': 'Initiative %d' % i, 'description': paragraphs(rng, 1), 'order': i % 10}),
+            (Workshop, lambda i: {'title': 'Workshop %d' % i, 'description': paragraphs(rng, 1), 'date': moment(i),
+                                  'location': 'SUST', 'order': i % 10}),
+            (Alumni, lambda i: {'name': 'Alumnus %d' % i, 'department': rng.choice(['CSE', 'EEE', 'IPE', 'MEE']),
+                                'batch': '20%02d-%02d' % (i % 20, i % 20 + 1), 'order': i % 10}),
+            (Project, lambda i: {'title': 'Project %d' % i, 'description': paragraphs(rng, 1),
+                                 'status': rng.choice(['ongoing', 'completed']), 'order': i % 10, 'created_at': moment(i)}),
+        ]
+        for model, make in simple:
+            rows = [make(i) for i in range(items)]
+            insert(db, model, rows)
+            counts[model.__tablename__] = len(rows)
+
+        rows = [{'title': 'Blog post %d: %s' % (i, sentence(rng, 6)), 'content': paragraphs(rng, 6),
+                 'excerpt': sentence(rng, 20) if i % 3 else None, 'author': 'RoboSUST', 'published': i % 5 != 0,
+                 'created_at': moment(i), 'updated_at': moment(i)} for i in range(blog_posts)]
+        insert(db, BlogPost, rows)
+        counts['blog_post'] = len(rows)
+
+        category_ids = [c.id for c in ForumCategory.query.all()]
+        if not category_ids:
+            insert(db, ForumCategory, [{'name': 'Category %d' % i, 'order': i} for i in range(5)])
+            category_ids = [c.id for c in ForumCategory.query.all()]
+        first_post = (db.session.query(db.func.max(ForumPost.id)).scalar() or 0) + 1
+        rows = [{'title': sentence(rng, 8), 'content': paragraphs(rng, 2), 'author_name': 'member%d' % (i % 300),
+                 'category_id': rng.choice(category_ids), 'created_at': moment(i)} for i in range(forum_posts)]
+        insert(db, ForumPost, rows)
+        counts['forum_post'] = len(rows)
+
+        post_ids = range(first_post, first_post + forum_posts)
+        # Skewed like a real forum: a few threads collect most of the replies
+        rows = [{'content': paragraphs(rng, 1), 'author_name': 'member%d' % (i % 300),
+                 'post_id': post_ids[min(int(rng.paretovariate(1.2)) - 1, forum_posts - 1)] if forum_posts else None,
+                 'created_at': moment(i)} for i in range(forum_replies if forum_posts else 0)]
+        insert(db, ForumReply, rows)
+        counts['forum_reply'] = len(rows)
+
+        # Bulk inserts skip the flush hooks: bump every version and rebuild search in one go
+        cache.touch_tables(db.session, set(counts))
+        search.rebuild_search_index()
+        db.session.commit()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--blog-posts', type=int, default=10000)
+    parser.add_argument('--forum-posts', type=int, default=5000)
+    parser.add_argument('--forum-replies', type=int, default=100000)
+    parser.add_argument('--items', type=int, default=200, help='rows for each of the home page collections and projects')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    app = load_app(args.database_url)
+    started = time.perf_counter()
+    counts = seed(app, args.blog_posts, args.forum_posts, args.forum_replies, args.items, args.seed)
+    for table, count in counts.items():
+        print('%-14s %8d' % (table, count))
+    print('seeded in %.1fs' % (time.perf_counter() - started))
+
+if __name__ == '__main__':
+    main()
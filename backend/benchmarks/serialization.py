@@ -0,0 +1,80 @@
+"""JSON encoding time per listing, old to_dict() + jsonify versus the model serializers.
+
+    python benchmarks/serialization.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import datetime
+import time
+from flask.json.provider import DefaultJSONProvider
+from common import load_app
+
+def sample_rows(models, count):
+    now = datetime.datetime(2026, 1, 1, 12, 0, 0, 123456)
+    text = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 4
+    values = {
+        'title': 'A reasonably long title for a listing row', 'name': 'Member Name', 'description': text,
+        'content': text * 4, 'excerpt': text[:150], 'image': '/assets/images/workshop/1.jpg', 'date': now,
+        'created_at': now, 'updated_at': now, 'order': 3, 'status': 'ongoing', 'location': 'SUST',
+        'department': 'CSE', 'batch': '2019-20', 'current_position': 'Engineer', 'linkedin': 'https://linkedin.com/in/x',
+        'github': 'https://github.com/x', 'demo': None, 'author': 'RoboSUST', 'published': True,
+        'author_name': 'Forum User', 'author_email': None, 'category_id': 2, 'post_id': 7,
+        # Column properties that listings load with the row
+        'preview': text[:150], 'post_count': 42, 'category_name': 'General', 'reply_count': 5,
+    }
+    rows = {}
+    for model in models:
+        names = set(model.serializer.names) | set(getattr(model, 'SUMMARY_COLUMNS', ()))
+        rows[model] = []
+        for i in range(count):
+            obj = model()
+            obj.id = i + 1
+            for name in names:
+                if name in values:
+                    setattr(obj, name, values[name])
+            rows[model].append(obj)
+    return rows
+
+def best_of(repeat, f):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(f())
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = load_app()
+    import serializers
+    from models import Achievement, Initiative, Workshop, Alumni, Project, BlogPost, ForumCategory, ForumPost, ForumReply
+
+    models = [Achievement, Initiative, Workshop, Alumni, Project, BlogPost, ForumCategory, ForumPost, ForumReply]
+    rows = sample_rows(models, args.rows)
+    stdlib = DefaultJSONProvider(app)
+    orjson = serializers.orjson
+
+    print('%d rows per model, best of %d (ms)' % (args.rows, args.repeat))
+    print('%-14s %16s %18s %18s' % ('model', 'to_dict+jsonify', 'serializer+json', 'serializer+orjson'))
+    with app.test_request_context():
+        for model in models:
+            objs = rows[model]
+            baseline, _ = best_of(args.repeat, lambda: stdlib.response([o.to_dict() for o in objs]).get_data())
+            serializers.orjson = None
+            fallback, _ = best_of(args.repeat, lambda: model.serializer.dumps(objs))
+            serializers.orjson = orjson
+            fast, _ = best_of(args.repeat, lambda: model.serializer.dumps(objs)) if orjson else (float('nan'), 0)
+            print('%-14s %16.1f %18.1f %18.1f' % (model.__name__, baseline, fallback, fast))
+        for model in (BlogPost, ForumPost):
+            objs = rows[model]
+            baseline, _ = best_of(args.repeat, lambda: stdlib.response([o.to_summary_dict() for o in objs]).get_data())
+            fast, _ = best_of(args.repeat, lambda: model.summary_serializer.dumps(objs)) if orjson else (float('nan'), 0)
+            print('%-14s %16.1f %18s %18.1f' % (model.__name__ + ' list', baseline, '', fast))
+    if orjson is None:
+        print('orjson is not installed; pip install orjson for the fast path')
+
+if __name__ == '__main__':
+    main()
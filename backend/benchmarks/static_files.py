@@ -0,0 +1,61 @@
+"""Worker time per /uploads hit, served directly versus offloaded to the proxy.
+
+    python benchmarks/static_files.py [--size-mb 5] [--requests 200]
+"""
+import argparse
+import os
+import tempfile
+import time
+from common import load_app
+
+def measure(client, url, requests, headers=None):
+    # Wall and CPU time spent inside the worker, including reading the body
+    wall = cpu = 0.0
+    sent = 0
+    for _ in range(requests):
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        response = client.get(url, headers=headers or {})
+        for chunk in response.response:
+            sent += len(chunk)
+        response.close()
+        wall += time.perf_counter() - start_wall
+        cpu += time.process_time() - start_cpu
+    return {
+        'wall_ms': wall / requests * 1000,
+        'cpu_ms': cpu / requests * 1000,
+        'body_bytes': sent // requests,
+        'status': response.status_code,
+        'cache_control': response.headers.get('Cache-Control')
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=5)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    app = load_app()
+    app.config['UPLOAD_FOLDER'] = tempfile.mkdtemp(prefix='robosust-uploads-')
+    filename = 'a' * 64 + '.mp4'
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], filename), 'wb') as f:
+        f.write(os.urandom(int(args.size_mb * 1024 * 1024)))
+    client = app.test_client()
+    url = '/uploads/' + filename
+
+    scenarios = [
+        ('direct (send_file)', '', False, None),
+        ('direct, Range: 1MB', '', False, {'Range': 'bytes=0-1048575'}),
+        ('x-sendfile', 'x-sendfile', True, None),
+        ('x-accel-redirect', 'x-accel', False, None),
+    ]
+    print('%-22s %10s %10s %12s %7s  %s' % ('mode', 'wall ms', 'cpu ms', 'body bytes', 'status', 'cache-control'))
+    for name, offload, sendfile, headers in scenarios:
+        app.config['UPLOAD_OFFLOAD'] = offload
+        app.config['USE_X_SENDFILE'] = sendfile
+        result = measure(client, url, args.requests, headers)
+        print('%-22s %10.3f %10.3f %12d %7d  %s' % (name, result['wall_ms'], result['cpu_ms'],
+                                                     result['body_bytes'], result['status'],
+                                                     result['cache_control']))
+
+if __name__ == '__main__':
+    main()
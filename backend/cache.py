@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+import hashlib
+import threading
+from flask import request, current_app, g
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, ContentVersion
+
+# Tables whose writes never change a public response
+UNVERSIONED_TABLES = {'admin', 'content_version', 'forum_event', 'job'}
+
+class CacheEntry:
+    __slots__ = ('versions', 'body', 'headers', 'encoded')
+
+    def __init__(self, versions, body, headers):
+        self.versions = versions
+        self.body = body
+        self.headers = headers
+        self.encoded = {}  # Content-Encoding -> compressed body, filled in by compression.py
+
+class ResponseCache:
+    # Thread-safe LRU of serialized response bodies, bounded by entry count
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+response_cache = ResponseCache()
+
+def init_app(app):
+    response_cache.max_entries = app.config.get('RESPONSE_CACHE_SIZE', 256)
+
+def versioned_tables():
+    return sorted(t for t in db.metadata.tables if t not in UNVERSIONED_TABLES)
+
+def ensure_versions():
+    # Create the per-table counters up front so writers never race on the insert
+    existing = {name for (name,) in db.session.query(ContentVersion.name)}
+    for name in versioned_tables():
+        if name not in existing:
+            db.session.add(ContentVersion(name=name, version=0))
+    db.session.commit()
+
+def touch_tables(session, tables):
+    # Bump the shared generation counters inside the caller's transaction, so the
+    # new version becomes visible to every worker exactly when the data does.
+    # The new versions are kept in session.info['table_versions'] (replicas.py
+    # hands them to the client as its consistency token).
+    table = ContentVersion.__table__
+    now = datetime.utcnow()
+    conn = session.connection()
+    versions = session.info.setdefault('table_versions', {})
+    for name in sorted(tables):
+        version = conn.execute(table.update()
+                               .where(table.c.name == name)
+                               .values(version=table.c.version + 1, updated_at=now)
+                               .returning(table.c.version)).scalar()
+        if version is None:
+            version = 1
+            conn.execute(table.insert().values(name=name, version=version, updated_at=now))
+        versions[name] = version
+    session.info.setdefault('touched_tables', set()).update(tables)
+
+@event.listens_for(Session, 'after_flush')
+def _touch_flushed_tables(session, flush_context):
+    tables = set()
+    for obj in session.new:
+        tables.add(obj.__table__.name)
+    for obj in session.deleted:
+        tables.add(obj.__table__.name)
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            tables.add(obj.__table__.name)
+    tables -= UNVERSIONED_TABLES
+    if tables:
+        touch_tables(session, tables)
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _reset_touched_tables(session):
+    session.info.pop('touched_tables', None)
+    session.info.pop('table_versions', None)
+
+def current_versions(tables):
+    # Returns the version tuple for the given tables and the latest write time among them
+    rows = db.session.query(ContentVersion.name, ContentVersion.version, ContentVersion.updated_at) \
+        .filter(ContentVersion.name.in_(tables)).all()
+    versions = {name: version for name, version, _ in rows}
+    stamps = [updated_at for _, _, updated_at in rows if updated_at]
+    last_modified = max(stamps).replace(microsecond=0, tzinfo=timezone.utc) if stamps else None
+    return tuple(versions.get(name, 0) for name in tables), last_modified
+
+def make_etag(tables, versions):
+    # Strong validator: the same tables at the same versions and query always
+    # serialize to the same bytes
+    raw = '%s|%s|%s|%s' % (request.path, request.query_string.decode('latin-1'), tables, versions)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:24]
+
+def not_modified(etag, last_modified):
+    # Returns the validator to send with a 304, or None. Compressed variants
+    # carry an -<encoding> suffix on the same etag.
+    if request.if_none_match:
+        if request.if_none_match.star_tag:
+            return etag
+        for tag in request.if_none_match:
+            if tag.split('-', 1)[0] == etag:
+                return tag
+        return None
+    if request.if_modified_since and last_modified and last_modified <= request.if_modified_since:
+        return etag
+    return None
+
+def add_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Let browsers and the CDN keep the body but revalidate on every use
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
+
+def cached(*models):
+    # Serve the stored body while the version of every table the route reads
+    # is unchanged; any committed write from any worker invalidates it.
+    # Conditional requests are answered from the version rows alone.
+    tables = tuple(sorted(m.__table__.name for m in models))
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            versions, last_modified = current_versions(tables)
+            etag = make_etag(tables, versions)
+            matched = not_modified(etag, last_modified)
+            if matched:
+                response = add_validators(current_app.response_class(status=304), matched, last_modified)
+                response.vary.add('Accept-Encoding')
+                return response
+
+            key = (request.path, request.query_string)
+            entry = response_cache.get(key)
+            if entry is not None and entry.versions == versions:
+                g.cache_entry = entry
+                response = current_app.response_class(entry.body, headers=entry.headers)
+                return add_validators(response, etag, last_modified)
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            headers = [(k, v) for k, v in response.headers if k != 'Content-Length']
+            g.cache_entry = CacheEntry(versions, response.get_data(), headers)
+            response_cache.set(key, g.cache_entry)
+            return add_validators(response, etag, last_modified)
+        return decorated
+    return decorator
@@ -0,0 +1,68 @@
+import gzip
+from flask import current_app, request, g
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Gzip/Brotli for /api JSON responses, negotiated from Accept-Encoding. Levels
+# are tuned for latency rather than ratio. Responses served through
+# cache.cached() keep their compressed bytes on the cache entry, so a hot route
+# compresses each payload once per encoding instead of on every request.
+COMPRESSIBLE_TYPES = {'application/json', 'text/plain', 'text/html', 'text/csv'}
+
+def init_app(app):
+    app.after_request(compress_response)
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def choose_encoding():
+    # Highest-q encoding the client accepts; identity if none
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = request.accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress(body, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(body, quality=config.get('BROTLI_QUALITY', 4))
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(body, compresslevel=config.get('GZIP_LEVEL', 5), mtime=0)
+
+def compress_response(response):
+    if not request.path.startswith('/api/') or response.status_code != 200:
+        return response
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    # SSE and export bodies are generators; compressing them would buffer the stream
+    if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    config = current_app.config
+    body = response.get_data()
+    if len(body) < config.get('COMPRESS_MIN_SIZE', 1024):
+        return response
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    entry = g.get('cache_entry')
+    if entry is not None and entry.body == body:
+        compressed = entry.encoded.get(encoding)
+        if compressed is None:
+            compressed = entry.encoded[encoding] = compress(body, encoding, config)
+    else:
+        compressed = compress(body, encoding, config)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # Each encoding is a different byte sequence, so it needs its own strong validator
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag('%s-%s' % (etag, encoding), weak)
+    return response
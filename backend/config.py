@@ -1,20 +1,80 @@
 import os
+import tempfile
 from dotenv import load_dotenv
+import database
 
 load_dotenv()
 
+def normalize_url(url):
+    # Render uses postgres:// but SQLAlchemy needs postgresql://
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    return url
+
 def get_database_url():
     url = os.environ.get('DATABASE_URL')
     if url:
-        # Render uses postgres:// but SQLAlchemy needs postgresql://
-        if url.startswith('postgres://'):
-            url = url.replace('postgres://', 'postgresql://', 1)
-        return url
+        return normalize_url(url)
     return 'sqlite:///robosust.db'
 
+def get_replica_urls():
+    return [normalize_url(url.strip()) for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'robosust-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = get_database_url()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Postgres pool sizing from DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT / DB_POOL_RECYCLE
+    SQLALCHEMY_ENGINE_OPTIONS = database.engine_options(SQLALCHEMY_DATABASE_URI)
+    # Read replicas for read-only routes, comma-separated; relative SQLite paths are under instance/ like the primary
+    SQLALCHEMY_BINDS = database.replica_binds(get_replica_urls())
+    REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', 5))  # seconds between health checks
+    REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 30))  # replicas missing older writes are skipped
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') != '0'  # WAL + pragmas + BEGIN IMMEDIATE for writes
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max request body (and chunk) size
+    MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 2 * 1024 * 1024 * 1024))  # 2GB max chunked upload
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # suggested chunk size for chunked uploads
+    # Hand /uploads file bodies to the front proxy instead of reading them in Python:
+    # '' (serve directly), 'x-accel' (nginx X-Accel-Redirect) or 'x-sendfile' (Apache/lighttpd)
+    UPLOAD_OFFLOAD = os.environ.get('UPLOAD_OFFLOAD', '')
+    UPLOAD_ACCEL_PREFIX = os.environ.get('UPLOAD_ACCEL_PREFIX', '/protected-uploads/')  # nginx internal location
+    USE_X_SENDFILE = UPLOAD_OFFLOAD == 'x-sendfile'
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))  # background image processing threads per worker
+    IMAGE_JOBS = os.environ.get('IMAGE_JOBS', '0') == '1'  # process images on the job queue instead
+    # Live forum updates: 'sse' holds streams open, 'poll' answers each request at once and the browser
+    # polls every STREAM_POLL_INTERVAL seconds; empty holds them only under gevent
+    LIVE_STREAMS = os.environ.get('LIVE_STREAMS', '')
+    STREAM_POLL_INTERVAL = float(os.environ.get('STREAM_POLL_INTERVAL', 5))
+    STREAM_MAX_PER_WORKER = int(os.environ.get('STREAM_MAX_PER_WORKER', 500))  # further streams are polled
+    # Held streams end after this long and the browser reconnects with Last-Event-ID;
+    # keep it under gunicorn's worker timeout
+    STREAM_DURATION = int(os.environ.get('STREAM_DURATION', 25))
+    AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 60))  # seconds a verified admin token skips the DB
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))  # cached GET responses per worker
+    # /api response compression: bodies under COMPRESS_MIN_SIZE bytes are sent as is
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 5))
+    BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 4))
+    # Per-worker metric snapshots summed by /metrics; cleared when gunicorn starts
+    METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'robosust-metrics')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # if set, /metrics requires "Authorization: Bearer <token>"
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 0))  # log statements slower than this; 0 disables
+    # Background jobs (jobs.py): run by JOB_THREADS threads inside each app process, so a single web
+    # deploy runs its own jobs; set it to 0 when `python worker.py` runs next to the web server
+    JOB_THREADS = int(os.environ.get('JOB_THREADS', 1))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))  # seconds an idle worker waits
+    JOB_BACKOFF = float(os.environ.get('JOB_BACKOFF', 10))  # first retry delay in seconds, doubled per attempt
+    JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 600))  # running jobs older than this are assumed lost
+    JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))  # finished jobs are deleted after this
+    # Static JSON copies of the public pages, e.g. ../frontend/dist/snapshots; empty disables them
+    SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '')
+    # Token buckets per client IP and endpoint, shared by all workers through a local SQLite file
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+    RATE_LIMIT_DB = os.environ.get('RATE_LIMIT_DB') or os.path.join(tempfile.gettempdir(), 'robosust-ratelimit.db')
+    RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', 0))  # 1 behind Render/nginx
+    RATE_LIMITS = {
+        'login': os.environ.get('RATE_LIMIT_LOGIN', '10/minute'),
+        'create_forum_post': os.environ.get('RATE_LIMIT_FORUM_POST', '5/minute'),
+        'create_forum_reply': os.environ.get('RATE_LIMIT_FORUM_REPLY', '20/minute'),
+    }
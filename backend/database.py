@@ -0,0 +1,158 @@
+import os
+import threading
+from flask import g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+
+# Engine tuning for both supported databases.
+#
+# SQLite: WAL lets readers run alongside the single writer, busy_timeout makes a
+# writer wait for the lock instead of failing, and writes open their transaction
+# with BEGIN IMMEDIATE. A deferred transaction that reads first and writes later
+# cannot wait for the lock (SQLite returns "database is locked" straight away to
+# avoid a deadlock), which is what concurrent forum posts and worker startup from
+# two gunicorn workers were hitting. In write requests the reads before the first
+# write run outside a transaction and BEGIN IMMEDIATE is issued just before that
+# write, so the lock is not held while a request authenticates and then streams
+# an upload body or hashes a password. Background threads still take the lock
+# when their transaction begins, because they read and then update the same rows,
+# unless the connection is opened with the read_only execution option (the job
+# queue's idle poll).
+#
+# Postgres: a sized, pre-pinged, recycled connection pool configured from env.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 20000)),  # negative = KiB
+}
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER', 'SAVEPOINT')
+REPLICA_BIND_PREFIX = 'replica_'
+
+def is_sqlite_url(url):
+    return url.startswith('sqlite')
+
+def engine_options(url):
+    if is_sqlite_url(url):
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+
+def replica_binds(urls):
+    # SQLALCHEMY_BINDS entries for DATABASE_REPLICA_URLS; no model uses them, so
+    # create_all() leaves the replicas alone and only replicas.py routes to them
+    binds = {}
+    for i, url in enumerate(urls):
+        options = engine_options(url)
+        if not is_sqlite_url(url):
+            # A replica that is down should fail its health check quickly
+            options['connect_args'] = {'connect_timeout': int(os.environ.get('REPLICA_CONNECT_TIMEOUT', 3))}
+        binds['%s%d' % (REPLICA_BIND_PREFIX, i)] = {'url': url, **options}
+    return binds
+
+class RoutingSession(Session):
+    # Reads of a request go to the replica engine replicas.read_only picked
+    # (g.db_replica); flushes and INSERT/UPDATE/DELETE always go to the primary
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = g.get('db_replica') if bind is None and has_app_context() else None
+        if replica is not None and not self._flushing and not isinstance(clause, UpdateBase):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class PoolStats:
+    # Connection pool counters, updated from pool events
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checked_out = 0
+
+    def incr(self, name, delta=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def snapshot(self, pool):
+        with self._lock:
+            stats = {
+                'connects_total': self.connects,
+                'checkouts_total': self.checkouts,
+                'checkins_total': self.checkins,
+                'invalidations_total': self.invalidations,
+                'checked_out': self.checked_out,
+            }
+        for name in ('size', 'overflow', 'checkedin'):
+            method = getattr(pool, name, None)
+            if callable(method):
+                stats['pool_' + name] = method()
+        return stats
+
+pool_stats = PoolStats()
+
+def init_app(app, db):
+    with app.app_context():
+        engine = db.engine
+    tune_sqlite = is_sqlite_url(app.config['SQLALCHEMY_DATABASE_URI']) and app.config.get('SQLITE_TUNING', True)
+    if tune_sqlite:
+        attach_sqlite_tuning(engine)
+    attach_pool_metrics(engine)
+
+def attach_sqlite_tuning(engine):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        # Take over transaction control from pysqlite so we choose the BEGIN mode
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute('PRAGMA %s=%s' % (name, value))
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin(conn):
+        if conn.get_execution_options().get('read_only'):
+            conn.exec_driver_sql('BEGIN')
+        elif not has_request_context():
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+        elif request.method in READ_METHODS:
+            conn.exec_driver_sql('BEGIN')
+        # Write requests begin in before_cursor_execute, at their first write
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def begin_on_write(conn, cursor, statement, parameters, context, executemany):
+        if (has_request_context() and request.method not in READ_METHODS
+                and not cursor.connection.in_transaction and is_write(statement)):
+            cursor.execute('BEGIN IMMEDIATE')
+
+def is_write(statement):
+    return statement.lstrip()[:9].upper().startswith(WRITE_STATEMENTS)
+
+def attach_pool_metrics(engine):
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        pool_stats.incr('connects')
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_stats.incr('checkouts')
+        pool_stats.incr('checked_out')
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        pool_stats.incr('checkins')
+        pool_stats.incr('checked_out', -1)
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        pool_stats.incr('invalidations')
+
+def stats(db):
+    return pool_stats.snapshot(db.engine.pool)
@@ -1,2 +1,64 @@
+import multiprocessing
+import os
+
+# Worker model, from GUNICORN_WORKER_CLASS:
+#   sync    - one request at a time per process; a slow client or an open stream pins the worker
+#   gthread - a pool of GUNICORN_THREADS threads per worker (default)
+#   gevent  - green threads; thousands of idle connections per worker, best with Postgres
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+cpus = multiprocessing.cpu_count()
+
+if worker_class == 'gevent':
+    # Patch before anything imports threading or socket, including on_starting below;
+    # module-level locks and thread locals created unpatched would be shared by every greenlet
+    from gevent import monkey
+    monkey.patch_all()
+
 bind = "0.0.0.0:10000"
-workers = 2
+if worker_class == 'sync':
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpus * 2 + 1))
+else:
+    workers = int(os.environ.get('WEB_CONCURRENCY', max(2, cpus)))
+threads = int(os.environ.get('GUNICORN_THREADS', max(4, cpus * 2) if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+# Streams and uploads legitimately stay open longer than a normal request
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+
+# Every thread of a worker may hold a connection at once; size the pool to match
+# unless DB_POOL_SIZE is set explicitly (the workers inherit this environment)
+os.environ.setdefault('DB_POOL_SIZE', str(max(5, threads)))
+
+def on_starting(server):
+    # Runs once in the master before any worker exists: migrate the schema and
+    # create the default rows here, so workers boot without touching the database
+    import time
+    import metrics
+    from app import create_app, init_db
+    from config import Config
+    from models import db
+
+    class BootstrapConfig(Config):
+        JOB_THREADS = 0  # jobs run in the workers, not the master
+
+    started = time.perf_counter()
+    app = create_app(BootstrapConfig)
+    # Metric snapshots from a previous run would be summed into this one
+    metrics.clear_directory(app.config['METRICS_DIR'])
+    init_db(app)
+    with app.app_context():
+        # Forked workers must not share the master's connections
+        for engine in db.engines.values():
+            engine.dispose()
+    server.log.info('Database initialized in %.2fs', time.perf_counter() - started)
+
+def post_fork(server, worker):
+    # psycopg2 blocks the whole gevent hub while it waits on Postgres unless its
+    # wait callback is made cooperative
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            server.log.warning('psycogreen is not installed; Postgres queries will block other greenlets')
+        else:
+            patch_psycopg()
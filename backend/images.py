@@ -0,0 +1,314 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import threading
+import uuid
+import zlib
+from flask import current_app, has_app_context
+from werkzeug.utils import secure_filename
+
+# Uploads are stored under the SHA-256 of their bytes, so re-uploading the same
+# file reuses the stored copy. Images lose their EXIF/XMP metadata before they
+# are hashed, by copying their segments without decoding the pixels, so the
+# published original is never re-encoded or changed afterwards. They are then
+# re-encoded off the request thread into width-bucketed WebP and JPEG variants,
+# and a <digest>.json manifest describes them for srcset.
+VARIANT_WIDTHS = (320, 640, 1024, 1600)
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+CHUNK_SIZE = 64 * 1024
+# <sha256>.<ext> originals and <sha256>-<width>.<ext> variants; their bytes never change
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{64}(-\d+)?\.(?!json$)\w+$')
+ORIENTATION_TAG = 0x0112
+# APP1 (EXIF, XMP), APP13 (IPTC) and COM segments; APP1 only with these signatures
+JPEG_METADATA_MARKERS = {b'\xff\xe1', b'\xff\xed', b'\xff\xfe'}
+JPEG_APP1_METADATA = (b'Exif\x00\x00', b'http://ns.adobe.com/xap/1.0/\x00', b'http://ns.adobe.com/xmp/extension/\x00')
+PNG_METADATA_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'eXIf'}
+WEBP_EXIF_FLAG, WEBP_XMP_FLAG = 0x08, 0x04
+
+_executor = None
+_executor_lock = threading.Lock()
+_manifests = {}
+
+def save_upload(file, folder):
+    # Stream the upload to a temp file while hashing it; returns the stored filename
+    ext = os.path.splitext(secure_filename(file.filename))[1].lower()
+    tmp_path = os.path.join(folder, '.tmp-%s' % uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    with open(tmp_path, 'wb') as out:
+        for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            out.write(chunk)
+    return store_upload(tmp_path, digest.hexdigest(), ext, folder)
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def store_upload(tmp_path, digest, ext, folder):
+    # Images are cleaned before they get their name: the stored file is published
+    # as immutable, so its bytes must be final and match the hash
+    if ext in IMAGE_EXTENSIONS and strip_metadata(tmp_path):
+        digest = hash_file(tmp_path)
+    return store_file(tmp_path, digest, ext, folder)
+
+def strip_metadata(path):
+    # Copies the image without its EXIF/XMP/IPTC/comment segments or text chunks;
+    # the pixel data is copied byte for byte, never decoded. An EXIF rotation is
+    # kept as a minimal EXIF block holding only the orientation. Returns False
+    # when there was nothing to remove or the file isn't laid out as expected.
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(path) as img:  # reads the header only
+            image_format = img.format
+            orientation = img.getexif().get(ORIENTATION_TAG, 1)
+    except (UnidentifiedImageError, OSError):
+        return False  # not really an image; variant generation will report it
+    strip = {'JPEG': strip_jpeg, 'PNG': strip_png, 'WEBP': strip_webp}.get(image_format)
+    if strip is None:
+        return False
+    tmp_path = '%s.clean' % path
+    try:
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            removed = strip(src, dst, orientation if orientation in range(2, 9) else None)
+    except (ValueError, struct.error):
+        removed = False
+    if not removed:
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+def orientation_tiff(orientation):
+    # Big-endian TIFF header and a one-entry IFD: Orientation, SHORT, count 1
+    return b'MM\x00\x2a' + struct.pack('>IHHHIHHI', 8, 1, ORIENTATION_TAG, 3, 1, orientation, 0, 0)
+
+def read_exact(src, size):
+    data = src.read(size)
+    if len(data) != size:
+        raise ValueError('truncated image')
+    return data
+
+def copy_bytes(src, dst, size):
+    while size > 0:
+        block = read_exact(src, min(CHUNK_SIZE, size))
+        dst.write(block)
+        size -= len(block)
+
+def strip_jpeg(src, dst, orientation):
+    if read_exact(src, 2) != b'\xff\xd8':
+        raise ValueError('not a JPEG')
+    dst.write(b'\xff\xd8')
+    if orientation:
+        exif = b'Exif\x00\x00' + orientation_tiff(orientation)
+        dst.write(b'\xff\xe1' + struct.pack('>H', len(exif) + 2) + exif)
+    removed = False
+    while True:
+        marker = read_exact(src, 2)
+        if marker[0] != 0xff:
+            raise ValueError('bad JPEG marker')
+        size = struct.unpack('>H', read_exact(src, 2))[0]
+        if marker == b'\xff\xda':
+            # Start of scan: the rest is entropy-coded data, copied as is
+            dst.write(marker + struct.pack('>H', size))
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            return removed
+        payload = read_exact(src, size - 2)
+        if marker in JPEG_METADATA_MARKERS and (marker != b'\xff\xe1' or payload.startswith(JPEG_APP1_METADATA)):
+            removed = True
+            continue
+        dst.write(marker + struct.pack('>H', size) + payload)
+
+def strip_png(src, dst, orientation):
+    signature = read_exact(src, 8)
+    dst.write(signature)
+    removed = False
+    while True:
+        header = read_exact(src, 8)
+        size, kind = struct.unpack('>I', header[:4])[0], header[4:]
+        if kind in PNG_METADATA_CHUNKS:
+            src.seek(size + 4, os.SEEK_CUR)
+            removed = True
+            continue
+        if kind == b'IDAT' and orientation:
+            # eXIf must come before the image data
+            exif = orientation_tiff(orientation)
+            dst.write(struct.pack('>I', len(exif)) + b'eXIf' + exif
+                      + struct.pack('>I', zlib.crc32(b'eXIf' + exif)))
+            orientation = None
+        dst.write(header)
+        copy_bytes(src, dst, size + 4)
+        if kind == b'IEND':
+            return removed
+
+def strip_webp(src, dst, orientation):
+    riff = read_exact(src, 12)
+    if riff[:4] != b'RIFF' or riff[8:] != b'WEBP':
+        raise ValueError('not a WebP')
+    chunks, removed = [], False
+    while True:
+        header = src.read(8)
+        if len(header) < 8:
+            break
+        kind, size = header[:4], struct.unpack('<I', header[4:])[0]
+        padded = size + (size & 1)
+        if kind in (b'EXIF', b'XMP '):
+            src.seek(padded, os.SEEK_CUR)
+            removed = True
+        else:
+            chunks.append((kind, size, src.tell(), padded))
+            src.seek(padded, os.SEEK_CUR)
+    if not removed:
+        return False
+    exif = orientation_tiff(orientation) if orientation else None
+    body = sum(8 + padded for _, _, _, padded in chunks) + (8 + len(exif) if exif else 0)
+    dst.write(b'RIFF' + struct.pack('<I', 4 + body) + b'WEBP')
+    for kind, size, offset, padded in chunks:
+        src.seek(offset)
+        dst.write(kind + struct.pack('<I', size))
+        if kind == b'VP8X':
+            flags = read_exact(src, padded)
+            # Clear the EXIF and XMP bits, setting EXIF again for the kept orientation
+            first = (flags[0] & ~(WEBP_EXIF_FLAG | WEBP_XMP_FLAG)) | (WEBP_EXIF_FLAG if exif else 0)
+            dst.write(bytes([first]) + flags[1:])
+        else:
+            copy_bytes(src, dst, padded)
+    if exif:
+        # Only files with a VP8X header can carry EXIF, and it goes last
+        dst.write(b'EXIF' + struct.pack('<I', len(exif)) + exif)
+    return True
+
+def store_file(tmp_path, digest, ext, folder):
+    filename = digest + ext
+    path = os.path.join(folder, filename)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return filename
+
+def is_content_addressed(filename):
+    return bool(CONTENT_ADDRESSED.match(filename))
+
+def is_image(filename):
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+def manifest_path(folder, digest):
+    return os.path.join(folder, digest + '.json')
+
+def read_manifest(folder, digest):
+    try:
+        with open(manifest_path(folder, digest)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_manifest(folder, digest, manifest):
+    tmp_path = manifest_path(folder, digest) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path(folder, digest))
+
+def schedule(app, filename):
+    # Queue variant generation and return the manifest as it stands now
+    global _executor
+    folder = app.config['UPLOAD_FOLDER']
+    digest = os.path.splitext(filename)[0]
+    manifest = read_manifest(folder, digest)
+    if manifest and manifest['status'] == 'ready':
+        return manifest
+    manifest = {'src': '/uploads/' + filename, 'status': 'processing'}
+    write_manifest(folder, digest, manifest)
+    if app.config.get('IMAGE_JOBS'):
+        from models import db
+        import jobs
+
+        # Ahead of bulk work like seeding: an admin is waiting on the result
+        jobs.enqueue('process_image', {'filename': filename}, priority=10)
+        db.session.commit()
+        return manifest
+    with _executor_lock:
+        # Created lazily so each gunicorn worker gets its own pool after fork
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get('IMAGE_WORKERS', 2),
+                                           thread_name_prefix='images')
+    _executor.submit(process_image, app, filename)
+    return manifest
+
+def process_image(app, filename):
+    folder = app.config['UPLOAD_FOLDER']
+    digest = os.path.splitext(filename)[0]
+    try:
+        manifest = render_variants(folder, filename)
+    except Exception as e:
+        app.logger.exception('Image processing failed for %s', filename)
+        manifest = {'src': '/uploads/' + filename, 'status': 'failed', 'error': str(e)}
+    write_manifest(folder, digest, manifest)
+    if manifest['status'] == 'ready':
+        invalidate_image_tables(app, filename)
+
+def render_variants(folder, filename):
+    from PIL import Image, ImageOps
+
+    path = os.path.join(folder, filename)
+    digest = os.path.splitext(filename)[0]
+    variants = {'webp': [], 'jpeg': []}
+    with Image.open(path) as original:
+        img = ImageOps.exif_transpose(original)
+        img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        width, height = img.size
+        widths = [w for w in VARIANT_WIDTHS if w < width] + [width]
+        for w in widths:
+            resized = img if w == width else img.resize((w, round(height * w / width)), Image.LANCZOS)
+            name = '%s-%d' % (digest, w)
+            resized.save(os.path.join(folder, name + '.webp'), 'WEBP', quality=80, method=4)
+            resized.convert('RGB').save(os.path.join(folder, name + '.jpg'), 'JPEG',
+                                        quality=82, optimize=True, progressive=True)
+            variants['webp'].append({'url': '/uploads/%s.webp' % name, 'width': w})
+            variants['jpeg'].append({'url': '/uploads/%s.jpg' % name, 'width': w})
+    # The original is left alone: it was cleaned before it was stored under its hash
+    return {
+        'src': '/uploads/' + filename,
+        'status': 'ready',
+        'width': width,
+        'height': height,
+        'variants': variants,
+        'srcset': {fmt: ', '.join('%s %dw' % (v['url'], v['width']) for v in items)
+                   for fmt, items in variants.items()}
+    }
+
+def invalidate_image_tables(app, filename):
+    # Cached listings embed image_srcset, so bump the tables that can reference an upload
+    from models import db, BlogPost
+    import cache
+    import snapshots
+
+    with app.app_context():
+        tables = [t.name for t in db.metadata.sorted_tables
+                  if 'image' in t.c and t.name not in cache.UNVERSIONED_TABLES]
+        cache.touch_tables(db.session, tables)
+        # Blog post snapshots are one file per post: rewrite only the posts showing this image
+        post_ids = [post_id for (post_id,) in
+                    db.session.query(BlogPost.id).filter(BlogPost.image == '/uploads/' + filename)]
+        snapshots.mark_posts(db.session, BlogPost, post_ids)
+        db.session.commit()
+
+def image_srcset(url):
+    # srcset strings for an uploaded image once its variants are ready, else None
+    if not url or not url.startswith('/uploads/') or not has_app_context():
+        return None
+    digest = os.path.splitext(url[len('/uploads/'):])[0]
+    manifest = _manifests.get(digest)
+    if manifest is None:
+        manifest = read_manifest(current_app.config['UPLOAD_FOLDER'], digest)
+        if not manifest or manifest['status'] != 'ready':
+            return None
+        _manifests[digest] = manifest
+    return manifest['srcset']
@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from sqlalchemy import select
+from models import db, Job
+import serializers
+
+# A small persistent job queue in the application database. Request handlers
+# enqueue work in their own transaction and return; JOB_THREADS threads inside
+# the app (or worker.py) claim the highest-priority job that is due, run it
+# in a fresh app context and record the result. Failures are retried with
+# exponential backoff until max_attempts, then the job is marked failed.
+TASKS = {}  # name -> (function, max_attempts)
+MAINTENANCE_INTERVAL = 60
+MAX_BACKOFF = 3600
+
+_stopping = threading.Event()
+
+def task(name, max_attempts=3):
+    # Registers a function as a job; it is called with the payload as keyword arguments
+    def decorator(f):
+        TASKS[name] = (f, max_attempts)
+        return f
+    return decorator
+
+def enqueue(name, payload=None, priority=0, delay=0):
+    # Adds the job to the current session; it is visible to workers once the caller commits
+    if name not in TASKS:
+        raise ValueError('Unknown job %r' % name)
+    job = Job(name=name, payload=json.dumps(payload or {}), priority=priority,
+              max_attempts=TASKS[name][1], run_at=datetime.utcnow() + timedelta(seconds=delay))
+    db.session.add(job)
+    return job
+
+def worker_id():
+    return '%s:%d:%s' % (socket.gethostname(), os.getpid(), threading.current_thread().name)
+
+def claim():
+    # Marks the next due job as running and returns its id, or None if nothing is due.
+    # The lookup is a plain read, so an idle poll never takes SQLite's write lock;
+    # the conditional UPDATE loses cleanly when another worker claimed the job first.
+    now = datetime.utcnow()
+    db.session.connection(execution_options={'read_only': True})
+    job_id = db.session.scalar(select(Job.id).filter(Job.status == 'queued', Job.run_at <= now)
+                               .order_by(Job.priority.desc(), Job.run_at, Job.id).limit(1))
+    db.session.rollback()
+    if job_id is None:
+        return None
+    claimed = Job.query.filter(Job.id == job_id, Job.status == 'queued').update({
+        'status': 'running',
+        'attempts': Job.attempts + 1,
+        'locked_by': worker_id(),
+        'locked_at': now,
+    }, synchronize_session=False)
+    db.session.commit()
+    return job_id if claimed else None
+
+def backoff(attempts, base):
+    return min(MAX_BACKOFF, base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+def run(app, job_id):
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        function = TASKS.get(job.name, (None,))[0]
+        payload = json.loads(job.payload)
+        # Don't hold a transaction (on SQLite, the write lock) while the task works
+        db.session.commit()
+        try:
+            if function is None:
+                raise LookupError('No task registered as %r' % job.name)
+            result = function(**payload)
+            # The job's own writes and its completion commit together
+            job.status = 'done'
+            job.result = serializers.dumps(result).decode() if result is not None else None
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Job %d (%s) failed', job_id, job.name)
+            job = db.session.get(Job, job_id)
+            job.last_error = traceback.format_exc(limit=5)
+            if job.attempts < job.max_attempts:
+                job.status = 'queued'
+                job.run_at = datetime.utcnow() + timedelta(seconds=backoff(job.attempts, app.config['JOB_BACKOFF']))
+            else:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+            job.locked_by = job.locked_at = None
+            db.session.commit()
+
+def maintain(app):
+    # Requeue jobs whose worker died mid-run and delete old finished jobs
+    now = datetime.utcnow()
+    with app.app_context():
+        lost = Job.query.filter(Job.status == 'running',
+                                Job.locked_at < now - timedelta(seconds=app.config['JOB_TIMEOUT'])).all()
+        for job in lost:
+            job.last_error = 'Worker %s stopped responding' % job.locked_by
+            job.status = 'queued' if job.attempts < job.max_attempts else 'failed'
+            job.locked_by = job.locked_at = None
+        Job.query.filter(Job.status.in_(('done', 'failed')),
+                         Job.finished_at < now - timedelta(days=app.config['JOB_RETENTION_DAYS'])) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+
+def work(app, once=False):
+    # Runs jobs until stop() is called; with once=True, returns when nothing is due
+    last_maintenance = 0
+    while not _stopping.is_set():
+        job_id = None
+        try:
+            if time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+                maintain(app)
+                last_maintenance = time.monotonic()
+            with app.app_context():
+                job_id = claim()
+            if job_id is not None:
+                run(app, job_id)
+        except Exception:
+            # Database unavailable or locked for too long; try again on the next poll
+            app.logger.exception('Job worker error')
+        if job_id is None:
+            if once:
+                return
+            _stopping.wait(app.config['JOB_POLL_INTERVAL'])
+
+def stop():
+    # The current job finishes first
+    _stopping.set()
+
+def start_threads(app, count):
+    for i in range(count):
+        threading.Thread(target=work, args=(app,), name='jobs-%d' % i, daemon=True).start()
+
+def init_app(app):
+    # Threads start with the first request, so CLI commands and processes that
+    # never serve (a gunicorn master, the dev server's reloader) don't claim jobs
+    count = app.config.get('JOB_THREADS')
+    if not count:
+        return
+    started = threading.Event()
+    lock = threading.Lock()
+
+    @app.before_request
+    def start_job_threads():
+        if not started.is_set():
+            with lock:
+                if not started.is_set():
+                    start_threads(app, count)
+                    started.set()
@@ -0,0 +1,27 @@
+from sqlalchemy.orm import load_only
+from models import Achievement, Initiative, Workshop, Alumni, Project, BlogPost
+
+# Queries behind the public listings, shared by the API routes and the static
+# snapshots so both always return the same rows in the same order. Each takes
+# the session to run in: the request's db.session, or the snapshot writer's own.
+def achievements(session):
+    return session.query(Achievement).order_by(Achievement.order, Achievement.date.desc()).all()
+
+def initiatives(session):
+    return session.query(Initiative).order_by(Initiative.order).all()
+
+def workshops(session):
+    return session.query(Workshop).order_by(Workshop.order, Workshop.date.desc()).all()
+
+def alumni(session):
+    return session.query(Alumni).order_by(Alumni.order).all()
+
+def projects(session):
+    return session.query(Project).order_by(Project.order, Project.created_at.desc()).all()
+
+def blog_summaries(session, published_only=True):
+    # Unordered; pagination.page adds the keyset order and limit
+    query = session.query(BlogPost).options(load_only(*[getattr(BlogPost, c) for c in BlogPost.SUMMARY_COLUMNS]))
+    if published_only:
+        query = query.filter_by(published=True)
+    return query
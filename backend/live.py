@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+import json
+import threading
+import time
+from flask import current_app, request, stream_with_context
+from models import db, ForumEvent
+
+# Server-Sent Events for the forum. Writers add a ForumEvent row in the same
+# transaction as the post or reply, and each open stream polls the table for
+# rows newer than the last id it sent, so every gunicorn worker sees every event.
+#
+# An open stream pins a sync worker or a gthread thread for STREAM_DURATION, so
+# streams are only held open where they are cheap (gevent). Elsewhere, and once
+# a worker holds STREAM_MAX_PER_WORKER streams, the same URL answers at once with
+# the events since Last-Event-ID and a retry: of STREAM_POLL_INTERVAL, and
+# EventSource comes back for the next batch: short polling with no client change.
+POLL_INTERVAL = 1.0
+KEEPALIVE_INTERVAL = 15
+EVENT_RETENTION = timedelta(hours=1)
+BATCH_SIZE = 100
+
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+def publish(channel, event, payload):
+    db.session.query(ForumEvent) \
+        .filter(ForumEvent.created_at < datetime.utcnow() - EVENT_RETENTION) \
+        .delete(synchronize_session=False)
+    db.session.add(ForumEvent(channel=channel, event=event, payload=json.dumps(payload)))
+
+def format_event(event_id, event, data):
+    return 'id: %d\nevent: %s\ndata: %s\n\n' % (event_id, event, data)
+
+def last_event_id():
+    # EventSource sends Last-Event-ID on reconnect; allow a query param for the first connect
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+def fetch_events(channel, after_id):
+    rows = db.session.query(ForumEvent.id, ForumEvent.event, ForumEvent.payload) \
+        .filter(ForumEvent.channel == channel, ForumEvent.id > after_id) \
+        .order_by(ForumEvent.id).limit(BATCH_SIZE).all()
+    # Release the connection between polls so idle streams don't hold the pool
+    db.session.close()
+    return rows
+
+def cooperative():
+    # Under gevent an idle stream is a parked greenlet rather than a blocked thread
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+def hold_streams():
+    mode = current_app.config.get('LIVE_STREAMS')
+    return mode == 'sse' if mode else cooperative()
+
+def acquire_stream():
+    global _open_streams
+    with _streams_lock:
+        if _open_streams >= current_app.config.get('STREAM_MAX_PER_WORKER', 500):
+            return False
+        _open_streams += 1
+        return True
+
+def release_stream():
+    global _open_streams
+    with _streams_lock:
+        _open_streams -= 1
+
+def start_event(retry_ms, last_id):
+    # An id-only message sets the id EventSource resumes from, even before any event
+    return 'retry: %d\nid: %d\n\n' % (retry_ms, last_id)
+
+def event_response(body):
+    return current_app.response_class(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def poll(channel, after_id):
+    rows = fetch_events(channel, after_id)
+    # A full batch means more are waiting: come straight back for them
+    retry_ms = 0 if len(rows) == BATCH_SIZE else int(current_app.config.get('STREAM_POLL_INTERVAL', 5) * 1000)
+    return event_response(start_event(retry_ms, after_id) +
+                          ''.join(format_event(event_id, event, payload) for event_id, event, payload in rows))
+
+def stream(channel):
+    after_id = last_event_id()
+    if after_id is None:
+        after_id = db.session.query(db.func.max(ForumEvent.id)).scalar() or 0
+        db.session.close()
+    if not hold_streams() or not acquire_stream():
+        return poll(channel, after_id)
+    duration = current_app.config.get('STREAM_DURATION', 25)
+
+    def generate():
+        last_id = after_id
+        deadline = time.monotonic() + duration
+        last_write = time.monotonic()
+        yield start_event(2000, last_id)
+        while time.monotonic() < deadline:
+            rows = fetch_events(channel, last_id)
+            for event_id, event, payload in rows:
+                yield format_event(event_id, event, payload)
+                last_id = event_id
+            if rows:
+                last_write = time.monotonic()
+                continue
+            if time.monotonic() - last_write >= KEEPALIVE_INTERVAL:
+                yield ': keepalive\n\n'
+                last_write = time.monotonic()
+            time.sleep(POLL_INTERVAL)
+
+    response = event_response(stream_with_context(generate()))
+    # Runs when the server closes the response, whether or not the body was sent
+    response.call_on_close(release_stream)
+    return response
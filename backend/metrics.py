@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+import time
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+
+import database
+
+# Per-route request metrics in Prometheus text format. Each worker keeps its own
+# histograms in memory and periodically writes them to <pid>.json in
+# METRICS_DIR; /metrics sums the files of every worker, so any worker can answer
+# a scrape. Query count and DB time come from cursor execute events and are
+# charged to the route that issued them.
+PREFIX = 'robosust_'
+HISTOGRAMS = {
+    'request_duration_seconds': ('Request wall time by route',
+                                 (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    'db_duration_seconds': ('Time spent in SQL per request by route',
+                            (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)),
+    'db_queries': ('SQL statements per request by route', (0, 1, 2, 3, 5, 10, 20, 50, 100)),
+    'response_bytes': ('Response body size by route',
+                       (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)),
+}
+COUNTERS = {
+    'requests_total': 'Requests by route, method and status',
+    'slow_queries_total': 'Statements slower than SLOW_QUERY_MS by route',
+    'db_reads_total': 'Read-only requests by the database that served them (primary or replica bind)',
+}
+FLUSH_INTERVAL = 1.0
+STARTUP_PHASES = ('import', 'create_app', 'first_request')
+
+_lock = threading.Lock()
+_histograms = {}  # (name, route, method) -> [bucket counts..., +Inf count, sum]
+_counters = {}  # (name, labels) -> value
+_local = threading.local()
+_last_flush = 0.0
+_startup = {}  # phase -> seconds, for this process
+_ready_at = None
+
+def metrics_dir(app):
+    return app.config['METRICS_DIR']
+
+def clear_directory(path):
+    # Called once per server start, before workers fork, so old pids don't linger
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            if name.endswith('.json'):
+                os.remove(os.path.join(path, name))
+
+def init_app(app, db):
+    os.makedirs(metrics_dir(app), exist_ok=True)
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    with app.app_context():
+        engines = list(db.engines.values())  # the primary and any read replicas
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(engine, 'handle_error', handle_error)
+
+def record_startup(app, import_seconds, create_seconds):
+    global _ready_at
+    _startup['import'] = import_seconds
+    _startup['create_app'] = create_seconds
+    _ready_at = time.perf_counter()
+    app.logger.info('Process %d ready: import %.3fs, create_app %.3fs', os.getpid(), import_seconds, create_seconds)
+
+def route_label():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def start_request():
+    _local.start = time.perf_counter()
+    _local.queries = 0
+    _local.db_time = 0.0
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_start'].pop()
+    if getattr(_local, 'start', None) is None:
+        return  # startup, background threads
+    _local.queries += 1
+    _local.db_time += elapsed
+    slow_ms = current_app.config.get('SLOW_QUERY_MS')
+    if slow_ms and elapsed * 1000 >= slow_ms and has_request_context():
+        route = route_label()
+        increment('slow_queries_total', (('route', route),))
+        current_app.logger.warning('Slow query (%.1f ms) in %s %s: %s', elapsed * 1000, request.method,
+                                   route, ' '.join(statement.split()))
+
+def handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    stack = context.connection.info.get('metrics_start') if context.connection is not None else None
+    if stack:
+        stack.pop()
+
+def finish_request(response):
+    start = getattr(_local, 'start', None)
+    if start is None:
+        return response
+    _local.start = None
+    route, method = route_label(), request.method
+    elapsed = time.perf_counter() - start
+    observe('request_duration_seconds', route, method, elapsed)
+    if 'first_request' not in _startup:
+        # Cold caches, lazy imports and the first pool connection all land here
+        _startup['first_request'] = elapsed
+        waited = start - _ready_at if _ready_at is not None else 0
+        current_app.logger.info('Process %d first request %s %s took %.1f ms, %.1fs after startup',
+                                os.getpid(), method, route, elapsed * 1000, waited)
+    observe('db_duration_seconds', route, method, _local.db_time)
+    observe('db_queries', route, method, _local.queries)
+    # Streamed bodies (SSE, export) have no length up front
+    if response.content_length is not None:
+        observe('response_bytes', route, method, response.content_length)
+    increment('requests_total', (('route', route), ('method', method), ('status', str(response.status_code))))
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        flush(current_app._get_current_object())
+    return response
+
+def observe(name, route, method, value):
+    buckets = HISTOGRAMS[name][1]
+    key = (name, route, method)
+    with _lock:
+        values = _histograms.get(key)
+        if values is None:
+            values = _histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                values[i] += 1
+                break
+        else:
+            values[len(buckets)] += 1
+        values[-1] += value
+
+def increment(name, labels, amount=1):
+    key = (name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def flush(app):
+    global _last_flush
+    with _lock:
+        snapshot = {
+            'histograms': [[name, route, method, values] for (name, route, method), values in _histograms.items()],
+            'counters': [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            'startup': dict(_startup),
+        }
+        _last_flush = time.monotonic()
+    path = os.path.join(metrics_dir(app), '%d.json' % os.getpid())
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(path + '.tmp', path)
+
+def collect(app):
+    # Sum every worker's snapshot; files from workers that have exited still count
+    histograms, counters, startup = {}, {}, {}
+    directory = metrics_dir(app)
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, route, method, values in snapshot['histograms']:
+            total = histograms.setdefault((name, route, method), [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        startup[filename[:-len('.json')]] = snapshot.get('startup', {})
+    return histograms, counters, startup
+
+def format_labels(labels):
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels)
+
+def render(app, db):
+    flush(app)
+    histograms, counters, startup = collect(app)
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append('# HELP %s%s %s' % (PREFIX, name, help_text))
+        lines.append('# TYPE %s%s histogram' % (PREFIX, name))
+        for (metric, route, method), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            labels = (('route', route), ('method', method))
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], values[:-1]):
+                cumulative += count
+                lines.append('%s%s_bucket%s %d' % (PREFIX, name, format_labels(labels + (('le', bound),)), cumulative))
+            lines.append('%s%s_sum%s %s' % (PREFIX, name, format_labels(labels), values[-1]))
+            lines.append('%s%s_count%s %d' % (PREFIX, name, format_labels(labels), cumulative))
+    for name, help_text in COUNTERS.items():
+        lines.append('# HELP %s%s %s' % (PREFIX, name, help_text))
+        lines.append('# TYPE %s%s counter' % (PREFIX, name))
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append('%s%s%s %d' % (PREFIX, name, format_labels(labels), value))
+    lines.append('# HELP %sstartup_seconds Startup time by phase, per worker process' % PREFIX)
+    lines.append('# TYPE %sstartup_seconds gauge' % PREFIX)
+    for pid, phases in sorted(startup.items()):
+        for phase in STARTUP_PHASES:
+            if phase in phases:
+                lines.append('%sstartup_seconds%s %s' % (PREFIX, format_labels((('phase', phase), ('pid', pid))),
+                                                        phases[phase]))
+    # Pool gauges describe the worker that answered the scrape
+    labels = (('pid', os.getpid()),)
+    for key, value in database.stats(db).items():
+        kind = 'counter' if key.endswith('_total') else 'gauge'
+        lines.append('# TYPE %sdb_%s %s' % (PREFIX, key, kind))
+        lines.append('%sdb_%s%s %s' % (PREFIX, key, format_labels(labels), value))
+    return '\n'.join(lines) + '\n'
@@ -1,13 +1,54 @@
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import json
+from images import image_srcset
+from serializers import Serializer
+import database
 
-db = SQLAlchemy()
+# db.session is scoped to the Flask application context: every request, in any
+# thread or greenlet, and every `with app.app_context()` block gets its own session.
+# Code that hands work to another thread must open a new app context there.
+# Read-only views may be routed to a replica (see replicas.py).
+db = SQLAlchemy(session_options={'class_': database.RoutingSession})
+
+def srcset_field(obj):
+    return image_srcset(obj.image)
+
+def add_missing_columns():
+    # create_all() never alters existing tables, so add columns introduced since
+    # a database was created. New columns must be nullable or have a server_default.
+    with db.engine.begin() as conn:
+        # Inspect on the same connection: a second one would wait on this transaction's lock
+        inspector = db.inspect(conn)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = 'ALTER TABLE %s ADD COLUMN %s %s' % (
+                    table.name, column.name, column.type.compile(dialect=db.engine.dialect))
+                if column.server_default is not None:
+                    ddl += ' DEFAULT %s' % column.server_default.arg
+                if not column.nullable:
+                    ddl += ' NOT NULL'
+                conn.execute(db.text(ddl))
+
+def add_missing_indexes():
+    # create_all() only creates indexes along with new tables
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
 
 class Admin(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
+    # Embedded in issued tokens; bumping it revokes every outstanding token
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -15,6 +56,12 @@ class Admin(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+class ContentVersion(db.Model):
+    # One row per content table, bumped in the same transaction as every write to it
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Achievement(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -23,15 +70,10 @@ class Achievement(db.Model):
     date = db.Column(db.DateTime, default=datetime.utcnow)
     order = db.Column(db.Integer, default=0)
 
+    serializer = Serializer('id', 'title', 'description', 'image', ('image_srcset', srcset_field), 'date', 'order')
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'image': self.image,
-            'date': self.date.isoformat() if self.date else None,
-            'order': self.order
-        }
+        return self.serializer.to_dict(self)
 
 class Initiative(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -41,15 +83,10 @@ class Initiative(db.Model):
     status = db.Column(db.String(50), default='ongoing')
     order = db.Column(db.Integer, default=0)
 
+    serializer = Serializer('id', 'title', 'description', 'image', ('image_srcset', srcset_field), 'status', 'order')
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'image': self.image,
-            'status': self.status,
-            'order': self.order
-        }
+        return self.serializer.to_dict(self)
 
 class Workshop(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -60,16 +97,11 @@ class Workshop(db.Model):
     location = db.Column(db.String(200))
     order = db.Column(db.Integer, default=0)
 
+    serializer = Serializer('id', 'title', 'description', 'image', ('image_srcset', srcset_field), 'date',
+                            'location', 'order')
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'image': self.image,
-            'date': self.date.isoformat() if self.date else None,
-            'location': self.location,
-            'order': self.order
-        }
+        return self.serializer.to_dict(self)
 
 class Alumni(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -81,17 +113,11 @@ class Alumni(db.Model):
     linkedin = db.Column(db.String(500))
     order = db.Column(db.Integer, default=0)
 
+    serializer = Serializer('id', 'name', 'department', 'batch', 'image', ('image_srcset', srcset_field),
+                            'current_position', 'linkedin', 'order')
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'department': self.department,
-            'batch': self.batch,
-            'image': self.image,
-            'current_position': self.current_position,
-            'linkedin': self.linkedin,
-            'order': self.order
-        }
+        return self.serializer.to_dict(self)
 
 class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -104,18 +130,11 @@ class Project(db.Model):
     order = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    serializer = Serializer('id', 'title', 'description', 'image', ('image_srcset', srcset_field), 'status',
+                            'github', 'demo', 'order', 'created_at')
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'image': self.image,
-            'status': self.status,
-            'github': self.github,
-            'demo': self.demo,
-            'order': self.order,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        return self.serializer.to_dict(self)
 
 class BlogPost(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -127,19 +146,22 @@ class BlogPost(db.Model):
     published = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # First characters of the body, so listings never have to load `content`
+    preview = db.column_property(db.func.substr(content, 1, 150), deferred=True)
+
+    # Columns needed by to_summary_dict(), for use with load_only()
+    SUMMARY_COLUMNS = ('id', 'title', 'excerpt', 'image', 'author', 'published', 'created_at', 'updated_at', 'preview')
+
+    serializer = Serializer('id', 'title', 'content', 'excerpt', 'image', ('image_srcset', srcset_field), 'author',
+                            'published', 'created_at', 'updated_at')
+    summary_serializer = Serializer('id', 'title', ('excerpt', lambda p: p.excerpt or p.preview), 'image',
+                                    ('image_srcset', srcset_field), 'author', 'published', 'created_at', 'updated_at')
+
+    def to_summary_dict(self):
+        return self.summary_serializer.to_dict(self)
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'content': self.content,
-            'excerpt': self.excerpt,
-            'image': self.image,
-            'author': self.author,
-            'published': self.published,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return self.serializer.to_dict(self)
 
 class ForumCategory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -148,14 +170,10 @@ class ForumCategory(db.Model):
     order = db.Column(db.Integer, default=0)
     posts = db.relationship('ForumPost', backref='category', lazy=True)
 
+    serializer = Serializer('id', 'name', 'description', 'order', 'post_count')
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'order': self.order,
-            'post_count': len(self.posts)
-        }
+        return self.serializer.to_dict(self)
 
 class ForumPost(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -167,17 +185,18 @@ class ForumPost(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     replies = db.relationship('ForumReply', backref='post', lazy=True, cascade='all, delete-orphan')
 
+    SUMMARY_COLUMNS = ('id', 'title', 'author_name', 'category_id', 'created_at', 'category_name', 'reply_count')
+
+    serializer = Serializer('id', 'title', 'content', 'author_name', 'category_id', 'category_name', 'created_at',
+                            'reply_count')
+    summary_serializer = Serializer('id', 'title', 'author_name', 'category_id', 'category_name', 'created_at',
+                                    'reply_count')
+
+    def to_summary_dict(self):
+        return self.summary_serializer.to_dict(self)
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'content': self.content,
-            'author_name': self.author_name,
-            'category_id': self.category_id,
-            'category_name': self.category.name if self.category else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'reply_count': len(self.replies)
-        }
+        return self.serializer.to_dict(self)
 
 class ForumReply(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -187,11 +206,79 @@ class ForumReply(db.Model):
     post_id = db.Column(db.Integer, db.ForeignKey('forum_post.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    serializer = Serializer('id', 'content', 'author_name', 'post_id', 'created_at')
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'content': self.content,
-            'author_name': self.author_name,
-            'post_id': self.post_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        return self.serializer.to_dict(self)
+
+class ForumEvent(db.Model):
+    # Outbox of forum changes, read by the live streams in every worker
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(50), nullable=False, index=True)
+    event = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Job(db.Model):
+    # Background work queued by requests and run by worker.py (see jobs.py)
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    priority = db.Column(db.Integer, nullable=False, default=0)  # higher runs first
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    serializer = Serializer('id', 'name', 'status', 'priority', 'attempts', 'max_attempts', 'run_at', 'last_error',
+                            ('result', lambda j: json.loads(j.result) if j.result else None), 'created_at',
+                            'finished_at')
+
+    def to_dict(self):
+        return self.serializer.to_dict(self)
+
+# Aggregates loaded as correlated subqueries in the same SELECT as their parent
+# rows, so listings stay a single query instead of one lazy load per row
+ForumCategory.post_count = db.column_property(
+    db.select(db.func.count(ForumPost.id))
+    .where(ForumPost.category_id == ForumCategory.id)
+    .correlate_except(ForumPost)
+    .scalar_subquery()
+)
+
+ForumPost.category_name = db.column_property(
+    db.select(ForumCategory.name)
+    .where(ForumCategory.id == ForumPost.category_id)
+    .correlate_except(ForumCategory)
+    .scalar_subquery()
+)
+
+ForumPost.reply_count = db.column_property(
+    db.select(db.func.count(ForumReply.id))
+    .where(ForumReply.post_id == ForumPost.id)
+    .correlate_except(ForumReply)
+    .scalar_subquery()
+)
+
+# Indexes matching the listing queries in app.py: each ORDER BY is read straight
+# off an index, and the forum subqueries look up replies/posts by parent id.
+# Created for existing databases by add_missing_indexes()
+db.Index('ix_achievement_order_date', Achievement.order, Achievement.date.desc())
+db.Index('ix_initiative_order', Initiative.order)
+db.Index('ix_workshop_order_date', Workshop.order, Workshop.date.desc())
+db.Index('ix_alumni_order', Alumni.order)
+db.Index('ix_project_order_created_at', Project.order, Project.created_at.desc())
+db.Index('ix_blog_post_published_created_at', BlogPost.published, BlogPost.created_at, BlogPost.id)
+db.Index('ix_blog_post_created_at', BlogPost.created_at, BlogPost.id)
+db.Index('ix_forum_category_order', ForumCategory.order)
+db.Index('ix_forum_post_category_created_at', ForumPost.category_id, ForumPost.created_at, ForumPost.id)
+db.Index('ix_forum_post_created_at', ForumPost.created_at, ForumPost.id)
+db.Index('ix_forum_reply_post_id', ForumReply.post_id, ForumReply.created_at)
+db.Index('ix_forum_event_created_at', ForumEvent.created_at)
+db.Index('ix_job_status_priority_run_at', Job.status, Job.priority.desc(), Job.run_at)
@@ -0,0 +1,29 @@
+import base64
+import datetime
+from models import db
+
+# Keyset pagination over (created_at, id), newest first. The cursor is the
+# position of the last row returned, so each page costs the same regardless of depth.
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(row):
+    raw = '%s|%d' % (row.created_at.isoformat(), row.id)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    created_at, row_id = raw.split('|')
+    return datetime.datetime.fromisoformat(created_at), int(row_id)
+
+def page(query, model, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    # Returns (rows, next_cursor); raises ValueError for a malformed cursor
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            model.created_at < created_at,
+            db.and_(model.created_at == created_at, model.id < row_id)
+        ))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,95 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import current_app, jsonify, request
+
+# Token-bucket rate limiting keyed by client IP and endpoint. Buckets live in a
+# small local SQLite file (RATE_LIMIT_DB, not the main database), so every gunicorn
+# worker shares them and a check is one primary-key read and write. Limited
+# endpoints are rejected with 429 before any ORM work happens.
+LIMIT_FORMAT = re.compile(r'^\s*(\d+)\s*/\s*(second|minute|hour|day)\s*$')
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+PRUNE_EVERY = 1000  # checks between deletions of idle buckets
+IDLE_AFTER = 86400
+
+_local = threading.local()
+_checks = 0
+
+def parse_limit(value):
+    # '10/minute' -> (capacity, tokens per second)
+    match = LIMIT_FORMAT.match(value or '')
+    if not match:
+        raise ValueError('Rate limit must look like "10/minute", got %r' % value)
+    count, period = int(match.group(1)), PERIODS[match.group(2)]
+    return count, count / period
+
+def connection(path):
+    # sqlite3 connections can't be shared across threads; keep one per thread and file
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != path:
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')  # buckets are disposable
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                     'updated REAL NOT NULL)')
+        _local.conn, _local.path = conn, path
+    return conn
+
+def take(path, key, capacity, rate, now=None):
+    # Takes one token; returns 0 if allowed, else seconds until a token is available
+    global _checks
+    now = time.time() if now is None else now
+    conn = connection(path)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        if not wait:
+            tokens -= 1
+        conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+        _checks += 1
+        if _checks % PRUNE_EVERY == 0:
+            conn.execute('DELETE FROM buckets WHERE updated < ?', (now - IDLE_AFTER,))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return wait
+
+def client_ip():
+    # With N trusted proxies in front, the client is the Nth address from the
+    # right of X-Forwarded-For; anything further left can be spoofed
+    trusted = current_app.config.get('RATE_LIMIT_TRUSTED_PROXIES', 0)
+    route = request.access_route
+    if trusted and request.headers.get('X-Forwarded-For') and len(route) >= trusted:
+        return route[-trusted]
+    return request.remote_addr or 'unknown'
+
+def limited(f):
+    # Applies RATE_LIMITS[<view function name>] to the decorated view
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        config = current_app.config
+        limit = config.get('RATE_LIMITS', {}).get(f.__name__)
+        if config.get('RATE_LIMIT_ENABLED', True) and limit:
+            capacity, rate = parse_limit(limit)
+            key = '%s|%s' % (f.__name__, client_ip())
+            wait = take(config['RATE_LIMIT_DB'], key, capacity, rate)
+            if wait:
+                response = jsonify({'success': False, 'message': 'Too many requests, try again later'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(math.ceil(wait))
+                return response
+        return f(*args, **kwargs)
+    return decorated
+
+def init_app(app):
+    # Fail at startup rather than on the first limited request
+    for view, limit in app.config.get('RATE_LIMITS', {}).items():
+        parse_limit(limit)
+    os.makedirs(os.path.dirname(app.config['RATE_LIMIT_DB']) or '.', exist_ok=True)
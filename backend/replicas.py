@@ -0,0 +1,205 @@
+import itertools
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+import click
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event, exc, select
+from sqlalchemy.orm import Session
+
+import database
+import metrics
+from models import db, ContentVersion
+
+# Read replicas for the public GET routes. Views marked @read_only run against
+# the next healthy replica in round-robin order; everything else, and every
+# write, uses the primary. A replica is checked at most every
+# REPLICA_CHECK_INTERVAL seconds and skipped while it is unreachable or has been
+# missing a committed write for longer than REPLICA_MAX_LAG.
+#
+# Read-your-writes: a request that commits gets an X-Consistency-Token header
+# with the content versions it wrote ("forum_post:12,forum_reply:40"). A client
+# that sends it back is only served by a replica that has reached those
+# versions, otherwise by the primary. Replication applies commits in order, so
+# the latest token covers the client's earlier writes too.
+TOKEN_HEADER = 'X-Consistency-Token'
+TOKEN_PART = re.compile(r'^([a-z_]+):(\d+)$')
+MAX_TOKEN_TABLES = 16
+
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def available(self, interval, max_lag):
+        # One thread re-checks when the interval is up; the others use the last result
+        if time.monotonic() - self.checked_at >= interval and self._lock.acquire(blocking=False):
+            try:
+                self.check(max_lag)
+            finally:
+                self.checked_at = time.monotonic()
+                self._lock.release()
+        return self.healthy
+
+    def check(self, max_lag):
+        try:
+            lag = replication_lag(self.engine)
+        except exc.SQLAlchemyError as e:
+            self.set_healthy(False, 'unreachable (%s)' % e.__class__.__name__)
+            return
+        if lag > max_lag:
+            self.set_healthy(False, 'missing writes from %.0fs ago' % lag)
+        else:
+            self.set_healthy(True, 'lag under %.0fs' % max(lag, 0))
+
+    def set_healthy(self, healthy, reason):
+        if healthy != self.healthy:
+            current_app.logger.warning('Replica %s is %s: %s', self.name, 'back' if healthy else 'down', reason)
+        self.healthy = healthy
+
+class ReplicaPool:
+    def __init__(self):
+        self.replicas = []
+        self._next = itertools.count()
+
+    def candidates(self, interval, max_lag):
+        # Healthy replicas, starting from the next one in round-robin order
+        if not self.replicas:
+            return []
+        start = next(self._next) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        return [replica for replica in ordered if replica.available(interval, max_lag)]
+
+pool = ReplicaPool()
+
+def init_app(app):
+    engines = {}
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if key and key.startswith(database.REPLICA_BIND_PREFIX):
+                engines[key] = engine
+    pool.replicas = [Replica(key, engine) for key, engine in sorted(engines.items())]
+    for replica in pool.replicas:
+        if database.is_sqlite_url(str(replica.engine.url)) and app.config.get('SQLITE_TUNING', True):
+            database.attach_sqlite_tuning(replica.engine)
+        event.listen(replica.engine, 'handle_error', _mark_down_on_error(replica))
+
+    @app.cli.command('sync-replicas')
+    def sync_replicas_command():
+        sync_replicas()
+
+    if not pool.replicas:
+        return
+    app.after_request(add_token)
+    # Session-wide listener; a second app in the same process must not add it again
+    if not event.contains(Session, 'after_commit', _remember_versions):
+        # Ahead of the cache listener that clears session.info['table_versions']
+        event.listen(Session, 'after_commit', _remember_versions, insert=True)
+
+def replication_lag(engine):
+    # Seconds the replica has been missing the oldest write it lacks, by content
+    # version; 0 when it has every table's latest version
+    table = ContentVersion.__table__
+    with engine.connect() as conn:
+        applied = dict(conn.execute(select(table.c.name, table.c.version)).all())
+    with db.engine.connect() as conn:
+        latest = conn.execute(select(table.c.name, table.c.version, table.c.updated_at)).all()
+    missing = [updated_at for name, version, updated_at in latest
+               if version > applied.get(name, 0) and updated_at is not None]
+    if not missing:
+        return 0
+    return (datetime.utcnow() - min(missing)).total_seconds()
+
+def parse_token(value):
+    # {table: version}, or None for a missing or malformed token
+    if not value:
+        return None
+    wanted = {}
+    for part in value.split(',')[:MAX_TOKEN_TABLES]:
+        match = TOKEN_PART.match(part.strip())
+        if not match:
+            return None
+        wanted[match.group(1)] = int(match.group(2))
+    return wanted
+
+def format_token(versions):
+    return ','.join('%s:%d' % (name, version) for name, version in sorted(versions.items()))
+
+def caught_up(wanted):
+    # Runs in the request's session, so the view reads the same snapshot
+    rows = db.session.query(ContentVersion.name, ContentVersion.version) \
+        .filter(ContentVersion.name.in_(list(wanted))).all()
+    applied = dict(rows)
+    return all(applied.get(name, 0) >= version for name, version in wanted.items())
+
+def choose_replica():
+    # Sets g.db_replica for database.RoutingSession and returns the replica, or
+    # None when the request has to read from the primary
+    config = current_app.config
+    wanted = parse_token(request.headers.get(TOKEN_HEADER))
+    for replica in pool.candidates(config['REPLICA_CHECK_INTERVAL'], config['REPLICA_MAX_LAG']):
+        g.db_replica = replica.engine
+        if not wanted:
+            return replica
+        try:
+            if caught_up(wanted):
+                return replica
+        except exc.SQLAlchemyError:
+            pass  # marked down by the engine's handle_error listener
+        db.session.rollback()
+    g.pop('db_replica', None)
+    return None
+
+def read_only(f):
+    # Serves the view from a replica when one is configured, healthy and caught up
+    # with the client's consistency token; the view must not write
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if pool.replicas and request.method in database.READ_METHODS:
+            replica = choose_replica()
+            metrics.increment('db_reads_total', (('database', replica.name if replica else 'primary'),))
+        return f(*args, **kwargs)
+    return decorated
+
+def add_token(response):
+    versions = g.get('written_versions')
+    if versions:
+        response.headers[TOKEN_HEADER] = format_token(versions)
+    return response
+
+def _remember_versions(session):
+    versions = session.info.get('table_versions')
+    if versions and has_request_context():
+        g.written_versions = {**g.get('written_versions', {}), **versions}
+
+def _mark_down_on_error(replica):
+    def handle_error(context):
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, exc.OperationalError):
+            replica.set_healthy(False, str(context.original_exception).splitlines()[0])
+            replica.checked_at = time.monotonic()
+    return handle_error
+
+def sync_replicas():
+    # Local testing with SQLite files: copy the primary over each replica, which
+    # is what replication would do; run it again to let the replicas catch up
+    primary = db.engine.url
+    if not database.is_sqlite_url(str(primary)):
+        raise click.ClickException('sync-replicas only copies SQLite databases')
+    for replica in pool.replicas:
+        if not database.is_sqlite_url(str(replica.engine.url)):
+            click.echo('Skipping %s: not a SQLite file' % replica.name)
+            continue
+        source = sqlite3.connect(primary.database)
+        target = sqlite3.connect(replica.engine.url.database)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        click.echo('Copied %s to %s' % (primary.database, replica.engine.url.database))
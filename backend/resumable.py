@@ -0,0 +1,173 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from werkzeug.utils import secure_filename
+import images
+
+# Chunked, resumable uploads. Each session keeps a .part file and a small JSON
+# state file under UPLOAD_FOLDER/.partial, so any gunicorn worker can accept the
+# next chunk. Chunks are streamed straight to disk and must arrive in order;
+# a client that lost its connection asks for the current offset and continues.
+# Requests for a session take an exclusive flock on its .part file, so two
+# workers never write the same session at once. /complete marks the session
+# as verifying and the whole-file hash runs on the job queue (finish_session).
+PARTIAL_DIR = '.partial'
+STREAM_CHUNK = 64 * 1024
+SESSION_TTL = 24 * 60 * 60
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+SESSION_ID = re.compile(r'^[0-9a-f]{32}$')
+VERIFYING = 'verifying'
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
+def partial_dir(folder):
+    path = os.path.join(folder, PARTIAL_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def session_paths(folder, session_id):
+    if not SESSION_ID.match(session_id):
+        raise UploadError('Upload session not found', 404)
+    base = os.path.join(partial_dir(folder), session_id)
+    return base + '.json', base + '.part'
+
+def load_session(folder, session_id):
+    state_path, _ = session_paths(folder, session_id)
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise UploadError('Upload session not found', 404)
+
+def save_session(folder, session):
+    state_path, _ = session_paths(folder, session['id'])
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump(session, f)
+    os.replace(state_path + '.tmp', state_path)
+
+def remove_session(folder, session_id):
+    for path in session_paths(folder, session_id):
+        if os.path.exists(path):
+            os.remove(path)
+
+def lock_part(f, offset):
+    # Held until f is closed; a second request gets a 409 instead of tying up its worker
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise UploadError('Another request is writing this upload', 409, offset)
+
+def open_part(folder, session_id):
+    _, part_path = session_paths(folder, session_id)
+    try:
+        return open(part_path, 'r+b')
+    except OSError:
+        raise UploadError('Upload session not found', 404)
+
+def expire_sessions(folder):
+    cutoff = time.time() - SESSION_TTL
+    directory = partial_dir(folder)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+
+def create_session(folder, filename, size, checksum, max_size):
+    if not filename or not secure_filename(filename):
+        raise UploadError('A filename is required')
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('File size must be a positive integer')
+    if size > max_size:
+        raise UploadError('File exceeds the %d byte upload limit' % max_size, 413)
+    expire_sessions(folder)
+    session = {
+        'id': uuid.uuid4().hex,
+        'filename': secure_filename(filename),
+        'size': size,
+        'offset': 0,
+        'checksum': checksum.lower() if checksum else None
+    }
+    _, part_path = session_paths(folder, session['id'])
+    open(part_path, 'wb').close()
+    save_session(folder, session)
+    return session
+
+def write_chunk(folder, session_id, stream, content_range, chunk_checksum=None):
+    # Appends one chunk at the session's current offset and returns the new state
+    session = load_session(folder, session_id)
+    match = CONTENT_RANGE.match(content_range or '')
+    if not match:
+        raise UploadError('Content-Range header must be "bytes start-end/total"')
+    start, end, total = (int(g) for g in match.groups())
+    if total != session['size'] or end < start or end >= total:
+        raise UploadError('Content-Range does not match the upload session')
+
+    with open_part(folder, session_id) as out:
+        lock_part(out, session['offset'])
+        # Re-read under the lock: another request may have moved the offset
+        session = load_session(folder, session_id)
+        if session.get('status') == VERIFYING:
+            raise UploadError('Upload is already complete', 409, session['offset'])
+        if start != session['offset']:
+            raise UploadError('Chunk does not start at the current offset', 409, session['offset'])
+        expected = end - start + 1
+        digest = hashlib.sha256()
+        written = 0
+        out.seek(start)
+        for block in iter(lambda: stream.read(min(STREAM_CHUNK, expected - written)), b''):
+            digest.update(block)
+            out.write(block)
+            written += len(block)
+            if written >= expected:
+                break
+        # Drop a short or corrupt chunk so the next attempt starts from a clean offset
+        if written != expected or (chunk_checksum and digest.hexdigest() != chunk_checksum.lower()):
+            out.truncate(start)
+            reason = 'Chunk is incomplete' if written != expected else 'Chunk checksum mismatch'
+            raise UploadError(reason, 400, start)
+
+        session['offset'] = end + 1
+        save_session(folder, session)
+    return session
+
+def complete_session(folder, session_id):
+    # Marks a fully received upload for verification; finish_session does the
+    # hashing, which would hold the request for seconds on a large file
+    session = load_session(folder, session_id)
+    with open_part(folder, session_id) as part:
+        lock_part(part, session['offset'])
+        session = load_session(folder, session_id)
+        if session.get('status') == VERIFYING:
+            raise UploadError('Upload is already being verified', 409, session['offset'])
+        if session['offset'] != session['size']:
+            raise UploadError('Upload is incomplete', 409, session['offset'])
+        session['status'] = VERIFYING
+        save_session(folder, session)
+    return session
+
+def finish_session(folder, session_id):
+    # Verifies the assembled file and moves it into content-addressed storage
+    session = load_session(folder, session_id)
+    if session.get('status') != VERIFYING:
+        raise UploadError('Upload session is not complete', 409, session['offset'])
+    _, part_path = session_paths(folder, session_id)
+    digest = hashlib.sha256()
+    with open(part_path, 'rb') as f:
+        for block in iter(lambda: f.read(STREAM_CHUNK), b''):
+            digest.update(block)
+    if session['checksum'] and digest.hexdigest() != session['checksum']:
+        remove_session(folder, session_id)
+        raise UploadError('File checksum mismatch')
+    ext = os.path.splitext(session['filename'])[1].lower()
+    filename = images.store_upload(part_path, digest.hexdigest(), ext, folder)
+    remove_session(folder, session_id)
+    return filename
@@ -0,0 +1,175 @@
+from html import escape
+import re
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from models import db, BlogPost, Project, ForumPost
+
+# Full-text index over published blog posts, projects and forum threads.
+# SQLite keeps it in an FTS5 virtual table; Postgres in a table with a generated
+# tsvector column and a GIN index. Both are keyed by doc_id = ref_id * 4 + kind
+# so a single row can be replaced by primary key when its source changes.
+SEARCH_TABLE = 'search_index'
+KINDS = {BlogPost: 1, Project: 2, ForumPost: 3}
+KIND_NAMES = {1: 'blog', 2: 'project', 3: 'forum'}
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+# SQLite scores every match with bm25, so a common word costs a pass over most of
+# the index; such queries are ranked among their newest SEARCH_MAX_CANDIDATES
+# matches and the response says it was truncated
+SEARCH_MAX_CANDIDATES = 2000
+# The last term is always a prefix query; FTS5 answers prefixes of these lengths
+# from their own index instead of merging every token that starts with them
+FTS_DEFINITION = ("fts5(kind UNINDEXED, ref_id UNINDEXED, title, body, tokenize='porter unicode61', "
+                  "prefix='2 3 4 5 6 7 8')")
+
+# Snippet highlight markers, swapped for <mark> after the text is HTML-escaped
+MARK_START, MARK_END = '\x02', '\x03'
+
+def is_sqlite(bind):
+    return bind.dialect.name == 'sqlite'
+
+def doc_id(obj):
+    return obj.id * 4 + KINDS[type(obj)]
+
+def document_for(obj):
+    # Returns (title, body) to index, or None if the row should not be searchable
+    if isinstance(obj, BlogPost):
+        if not obj.published:
+            return None
+        return obj.title, '\n'.join(filter(None, [obj.excerpt, obj.content]))
+    if isinstance(obj, Project):
+        return obj.title, obj.description
+    if isinstance(obj, ForumPost):
+        return obj.title, obj.content
+    return None
+
+def init_search_index():
+    bind = db.session.connection()
+    if is_sqlite(bind):
+        existing = bind.execute(text("SELECT sql FROM sqlite_master WHERE name = :name"),
+                                {'name': SEARCH_TABLE}).scalar()
+        if existing and FTS_DEFINITION not in existing:
+            # Built with older options; dropped here and filled again by the rebuild below
+            bind.execute(text(f"DROP TABLE {SEARCH_TABLE}"))
+        bind.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING {FTS_DEFINITION}"))
+    else:
+        bind.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            f"doc_id BIGINT PRIMARY KEY, kind SMALLINT NOT NULL, ref_id INTEGER NOT NULL, "
+            f"title TEXT, body TEXT, document tsvector GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('english', coalesce(body, '')), 'B')) STORED)"
+        ))
+        bind.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)"
+        ))
+    empty = bind.execute(text(f"SELECT 1 FROM {SEARCH_TABLE} LIMIT 1")).first() is None
+    if empty:
+        rebuild_search_index()
+    db.session.commit()
+
+def rebuild_search_index():
+    # Runs in the caller's transaction
+    conn = db.session.connection()
+    conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    for model in KINDS:
+        for obj in model.query.yield_per(500):
+            write_documents(conn, [obj])
+
+def write_documents(conn, objects, deleted=()):
+    doc_ids = [doc_id(obj) for obj in list(objects) + list(deleted)]
+    if not doc_ids:
+        return
+    key = 'rowid' if is_sqlite(conn) else 'doc_id'
+    conn.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE {key} = :doc_id"),
+                 [{'doc_id': d} for d in doc_ids])
+    rows = []
+    for obj in objects:
+        document = document_for(obj)
+        if document:
+            rows.append({'doc_id': doc_id(obj), 'kind': KINDS[type(obj)], 'ref_id': obj.id,
+                         'title': document[0], 'body': document[1]})
+    if rows:
+        conn.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} ({key}, kind, ref_id, title, body) "
+            f"VALUES (:doc_id, :kind, :ref_id, :title, :body)"
+        ), rows)
+
+def reindex(session, model, ids):
+    # For bulk writes that bypass the ORM flush (and so the hook below)
+    if model not in KINDS or not ids:
+        return
+    rows = session.query(model).filter(model.id.in_(ids)).all()
+    found = {row.id for row in rows}
+    write_documents(session.connection(), rows, [model(id=i) for i in set(ids) - found])
+
+@event.listens_for(Session, 'after_flush')
+def _index_flushed_documents(session, flush_context):
+    changed = [obj for obj in list(session.new) + list(session.dirty)
+               if type(obj) in KINDS and session.is_modified(obj, include_collections=False)]
+    deleted = [obj for obj in session.deleted if type(obj) in KINDS]
+    if changed or deleted:
+        write_documents(session.connection(), changed, deleted)
+
+def match_expression(query):
+    # Quote every term so user input can't inject FTS5 syntax; the last term
+    # is a prefix match so results appear while the user is still typing
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return None
+    quoted = ['"%s"' % term for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def highlight(snippet):
+    return escape(snippet or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+def sqlite_search(conn, params, limit):
+    # bm25 is only computed for matches at or above the rowid of the newest
+    # SEARCH_MAX_CANDIDATES-th match, so every page ranks the same window and
+    # results end there; the floor query walks the doclist by rowid without
+    # scoring. snippet() stays in the ranked query: a second MATCH would make
+    # FTS5 load the term doclists again, which costs more than the snippets
+    floor = conn.execute(text(
+        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :q "
+        f"ORDER BY rowid DESC LIMIT 1 OFFSET :skip"
+    ), {'q': params['q'], 'skip': SEARCH_MAX_CANDIDATES - 1}).scalar()
+    rows = conn.execute(text(
+        f"SELECT kind, ref_id, title, snippet({SEARCH_TABLE}, 3, :start, :end, '…', 24) AS snippet "
+        f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :q AND rowid >= :floor "
+        f"ORDER BY bm25({SEARCH_TABLE}, 0, 0, 10.0, 1.0) LIMIT :limit OFFSET :offset"
+    ), {**params, 'floor': floor or 0}).all()
+    return [result(*row) for row in rows[:limit]], len(rows) > limit, floor is not None
+
+def result(kind, ref_id, title, snippet):
+    return {
+        'type': KIND_NAMES[kind],
+        'id': ref_id,
+        'title': title,
+        'snippet': highlight(snippet)
+    }
+
+def search(query, page=1, limit=DEFAULT_PAGE_SIZE):
+    # Returns (results, has_more, truncated) for one page of ranked matches;
+    # truncated means only the newest SEARCH_MAX_CANDIDATES matches were ranked
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    params = {'limit': limit + 1, 'offset': (max(page, 1) - 1) * limit,
+              'start': MARK_START, 'end': MARK_END}
+    conn = db.session.connection()
+    if is_sqlite(conn):
+        params['q'] = match_expression(query)
+        if not params['q']:
+            return [], False, False
+        return sqlite_search(conn, params, limit)
+    params['q'] = query
+    # Rank inside the subquery so ts_headline only runs on the returned page
+    sql = (
+        f"SELECT kind, ref_id, title, ts_headline('english', body, q, "
+        f"'StartSel=' || :start || ', StopSel=' || :end || ', MaxWords=24, MinWords=8') AS snippet "
+        f"FROM (SELECT kind, ref_id, title, body, q, ts_rank(document, q) AS rank "
+        f"FROM {SEARCH_TABLE}, websearch_to_tsquery('english', :q) q WHERE document @@ q "
+        f"ORDER BY rank DESC LIMIT :limit OFFSET :offset) ranked ORDER BY rank DESC"
+    )
+    rows = conn.execute(text(sql), params).all()
+    results = [result(*row) for row in rows[:limit]]
+    return results, len(rows) > limit, False
@@ -0,0 +1,77 @@
+import datetime
+import json
+from operator import attrgetter
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON output without the per-row dict building and re-encoding of to_dict() +
+# jsonify. Each model declares its fields once; a Serializer compiles them into
+# getters per ?fields= projection and rows go straight to bytes, with datetimes
+# encoded natively by orjson. Falls back to the stdlib encoder when orjson is
+# not installed.
+MAX_PLANS = 64  # cached projections per serializer; ?fields= is user input
+
+def encode_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError('Object of type %s is not JSON serializable' % type(value).__name__)
+
+def dumps(obj):
+    # Serialize to bytes; datetimes become ISO 8601 strings with either encoder
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=encode_default, separators=(',', ':'), ensure_ascii=False).encode()
+
+class Serializer:
+    def __init__(self, *fields):
+        # Each field is a column/attribute name or a (name, function(obj)) pair
+        self.fields = tuple(f if isinstance(f, tuple) else (f, attrgetter(f)) for f in fields)
+        self.names = tuple(name for name, _ in self.fields)
+        self._plans = {}
+
+    def plan(self, fields=None, exclude=()):
+        key = (frozenset(fields) if fields is not None else None, frozenset(exclude))
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = tuple((name, getter) for name, getter in self.fields
+                         if (fields is None or name in fields or name == 'id') and name not in exclude)
+            if len(self._plans) < MAX_PLANS:
+                self._plans[key] = plan
+        return plan
+
+    def rows(self, objects, fields=None, exclude=()):
+        # Dicts with raw values, for dumps()
+        plan = self.plan(fields, exclude)
+        return [{name: getter(obj) for name, getter in plan} for obj in objects]
+
+    def dumps(self, objects, fields=None, exclude=()):
+        return dumps(self.rows(objects, fields, exclude))
+
+    def to_dict(self, obj):
+        # JSON-safe dict for callers that encode it themselves
+        return {name: value.isoformat() if isinstance(value, (datetime.datetime, datetime.date)) else value
+                for name, value in ((name, getter(obj)) for name, getter in self.fields)}
+
+class JSONProvider(DefaultJSONProvider):
+    # jsonify() through orjson when it is installed
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.options()).decode()
+
+    def options(self):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.options())
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import click
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import listings
+import pagination
+import serializers
+from models import db, Achievement, Initiative, Workshop, Alumni, Project, BlogPost
+
+# Static JSON copies of the public pages, written to SNAPSHOT_DIR so a CDN can
+# serve them without touching gunicorn. After each commit only the files whose
+# tables changed are rendered again; blog posts are written one file per
+# published post, and only the posts touched by the commit. Files are swapped
+# in with os.replace, so readers see either the old or the new version.
+def home(session):
+    return {'data': {
+        'achievements': Achievement.serializer.rows(listings.achievements(session)),
+        'initiatives': Initiative.serializer.rows(listings.initiatives(session)),
+        'workshops': Workshop.serializer.rows(listings.workshops(session)),
+        'alumni': Alumni.serializer.rows(listings.alumni(session)),
+    }}
+
+def collection(model, rows):
+    return lambda session: {'data': model.serializer.rows(rows(session))}
+
+def blog(session):
+    # First page of /api/blog; later pages come from the API via next_cursor
+    posts, next_cursor = pagination.page(listings.blog_summaries(session), BlogPost)
+    return {'data': BlogPost.summary_serializer.rows(posts), 'next_cursor': next_cursor}
+
+# name -> (tables it is built from, renderer)
+SNAPSHOTS = {
+    'home': ({'achievement', 'initiative', 'workshop', 'alumni'}, home),
+    'achievements': ({'achievement'}, collection(Achievement, listings.achievements)),
+    'initiatives': ({'initiative'}, collection(Initiative, listings.initiatives)),
+    'workshops': ({'workshop'}, collection(Workshop, listings.workshops)),
+    'alumni': ({'alumni'}, collection(Alumni, listings.alumni)),
+    'projects': ({'project'}, collection(Project, listings.projects)),
+    'blog': ({'blog_post'}, blog),
+}
+
+def init_app(app):
+    if not app.config.get('SNAPSHOT_DIR'):
+        return
+    os.makedirs(os.path.join(app.config['SNAPSHOT_DIR'], 'blog'), exist_ok=True)
+    # Session-wide listeners; a second app in the same process must not add them again
+    if event.contains(Session, 'after_commit', _write_touched):
+        return
+    event.listen(Session, 'after_flush', _collect_blog_posts)
+    # Ahead of the cache listener that clears session.info['touched_tables']
+    event.listen(Session, 'after_commit', _write_touched, insert=True)
+    event.listen(Session, 'after_rollback', _reset)
+
+    @app.cli.command('write-snapshots')
+    def write_snapshots_command():
+        click.echo('Wrote %d snapshot files' % len(write_snapshots()))
+
+def write_file(directory, name, obj):
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + name, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(serializers.dumps(obj))
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, os.path.join(directory, name + '.json'))
+
+def write_snapshots(tables=None, post_ids=None):
+    # tables=None renders everything; post_ids=None with blog_post touched renders every post
+    # and removes the files of posts that are gone
+    directory = current_app.config['SNAPSHOT_DIR']
+    written = []
+    # A session of its own: the caller's transaction has already been committed
+    with Session(db.engine) as session:
+        for name, (sources, render) in SNAPSHOTS.items():
+            if tables is None or sources & tables:
+                write_file(directory, name, render(session))
+                written.append(name)
+        if tables is None or 'blog_post' in tables:
+            written += write_blog_posts(session, os.path.join(directory, 'blog'), post_ids)
+    return written
+
+def write_blog_posts(session, directory, post_ids):
+    query = session.query(BlogPost).filter_by(published=True)
+    if post_ids is not None:
+        query = query.filter(BlogPost.id.in_(post_ids))
+    published = set()
+    for post in query.yield_per(500):
+        write_file(directory, str(post.id), {'data': post.to_dict()})
+        published.add(post.id)
+    # Deleted and unpublished posts lose their file
+    if post_ids is None:
+        stale = [int(f[:-5]) for f in os.listdir(directory) if f.endswith('.json') and f[:-5].isdigit()]
+    else:
+        stale = post_ids
+    for post_id in set(stale) - published:
+        try:
+            os.remove(os.path.join(directory, '%d.json' % post_id))
+        except FileNotFoundError:
+            pass
+    return ['blog/%d' % post_id for post_id in sorted(published)]
+
+def mark_posts(session, model, ids):
+    # Bulk statements skip the flush hooks; their callers report the rows they wrote here
+    if model is BlogPost:
+        session.info.setdefault('snapshot_posts', set()).update(ids)
+
+def _collect_blog_posts(session, flush_context):
+    ids = session.info.setdefault('snapshot_posts', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, BlogPost) and obj.id is not None:
+            ids.add(obj.id)
+
+def _write_touched(session):
+    tables = session.info.get('touched_tables')
+    post_ids = session.info.pop('snapshot_posts', set())
+    if not tables:
+        return
+    # Only the posts the commit wrote get their file again; rendering every post
+    # is left to `flask --app app write-snapshots`
+    try:
+        write_snapshots(set(tables), post_ids)
+    except Exception:
+        # The data is committed; a stale snapshot only costs a fallback to the API
+        current_app.logger.exception('Writing snapshots failed')
+
+def _reset(session):
+    session.info.pop('snapshot_posts', None)
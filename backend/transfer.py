@@ -0,0 +1,175 @@
+import datetime
+import json
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError, StatementError
+from models import db, Achievement, Initiative, Workshop, Alumni, Project, BlogPost, ForumCategory, ForumPost, ForumReply
+import cache
+import search
+import snapshots
+
+# NDJSON export/import of all site content, one {"table": ..., "row": {...}} object
+# per line. Export streams rows from a server-side cursor; import upserts rows in
+# batches by natural key with a single existence query per batch, so both run in
+# constant memory and can move data between SQLite and Postgres.
+BATCH_SIZE = 500
+
+# Export order respects foreign keys. Rows are matched on their natural key;
+# forum posts and replies have none, so they keep their ids.
+NATURAL_KEYS = [
+    (Achievement, 'title'),
+    (Initiative, 'title'),
+    (Workshop, 'title'),
+    (Alumni, 'name'),
+    (Project, 'title'),
+    (BlogPost, 'title'),
+    (ForumCategory, 'name'),
+    (ForumPost, 'id'),
+    (ForumReply, 'id'),
+]
+MODELS = {model.__tablename__: (model, key) for model, key in NATURAL_KEYS}
+# Foreign keys to rewrite when the referenced row was matched under a different id
+REMAPPED_COLUMNS = {'forum_post': {'category_id': 'forum_category'}}
+# Only these tables' id mappings are kept during an import; the rest keep their ids
+# or are never referenced, so memory doesn't grow with the number of rows
+REFERENCED_TABLES = {target for columns in REMAPPED_COLUMNS.values() for target in columns.values()}
+
+class TransferError(Exception):
+    def __init__(self, message, line=None):
+        super().__init__(message)
+        self.message = message if line is None else 'Line %d: %s' % (line, message)
+
+def encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+def export_lines():
+    for model, _ in NATURAL_KEYS:
+        table = model.__table__
+        result = db.session.execute(select(table).order_by(table.c.id).execution_options(yield_per=BATCH_SIZE))
+        for row in result.mappings():
+            yield json.dumps({'table': table.name, 'row': {k: encode_value(v) for k, v in row.items()}}) + '\n'
+
+def decode_row(model, row):
+    values = {}
+    for column in model.__table__.columns:
+        if column.name not in row:
+            continue
+        value = row[column.name]
+        if isinstance(column.type, db.DateTime) and isinstance(value, str):
+            value = datetime.datetime.fromisoformat(value)
+        values[column.name] = value
+    return values
+
+def upsert_rows(model, key, rows, update_existing=True):
+    # Inserts rows whose natural key is new and updates (or skips) the rest.
+    # Returns {incoming id: stored id} for every row that carried an id.
+    column = getattr(model, key)
+    existing = dict(db.session.query(column, model.id).filter(column.in_({row[key] for row in rows})))
+
+    inserts, updates, remap = {}, [], {}
+    for row in rows:
+        incoming_id = row.get('id')
+        stored_id = existing.get(row[key])
+        if stored_id is not None:
+            if update_existing:
+                updates.append({**row, 'id': stored_id})
+            if incoming_id is not None:
+                remap[incoming_id] = stored_id
+        elif row[key] in inserts:
+            inserts[row[key]][1].update({k: v for k, v in row.items() if k != 'id'})
+        else:
+            insert = dict(row) if key == 'id' else {k: v for k, v in row.items() if k != 'id'}
+            inserts[row[key]] = (incoming_id, insert)
+
+    if inserts:
+        # return_defaults fills in the ids assigned to new rows
+        db.session.bulk_insert_mappings(model, [insert for _, insert in inserts.values()],
+                                        return_defaults=key != 'id')
+        for incoming_id, insert in inserts.values():
+            if incoming_id is not None:
+                remap[incoming_id] = insert['id']
+    if updates:
+        db.session.bulk_update_mappings(model, updates)
+
+    # Bulk statements skip the flush hooks, so bump the version and reindex here
+    changed = [row['id'] for row in updates] + [insert['id'] for _, insert in inserts.values()]
+    if changed:
+        cache.touch_tables(db.session, {model.__tablename__})
+        search.reindex(db.session, model, changed)
+        snapshots.mark_posts(db.session, model, changed)
+    return remap
+
+def rejected_line(model, key, rows, numbers):
+    # Replays a rejected batch one row at a time to find the line the database refuses
+    for row, number in zip(rows, numbers):
+        try:
+            with db.session.begin_nested():
+                upsert_rows(model, key, [row])
+        except (IntegrityError, StatementError):
+            return number
+    return numbers[0]
+
+def import_lines(lines):
+    # Returns {table: rows processed}; the caller commits
+    counts = {}
+    remaps = {}
+    pending_table, pending, pending_numbers = None, [], []
+
+    def flush():
+        if not pending:
+            return
+        model, key = MODELS[pending_table]
+        for column, target in REMAPPED_COLUMNS.get(pending_table, {}).items():
+            mapping = remaps.get(target, {})
+            for row in pending:
+                row[column] = mapping.get(row.get(column), row.get(column))
+        try:
+            # A savepoint per batch, so a rejected batch can be replayed row by row
+            with db.session.begin_nested():
+                remap = upsert_rows(model, key, pending)
+        except (IntegrityError, StatementError) as e:
+            raise TransferError('Rejected by the database: %s' % e.orig,
+                                rejected_line(model, key, pending, pending_numbers))
+        if pending_table in REFERENCED_TABLES:
+            remaps.setdefault(pending_table, {}).update(remap)
+        counts[pending_table] = counts.get(pending_table, 0) + len(pending)
+        pending.clear()
+        pending_numbers.clear()
+
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise TransferError('Invalid JSON', number)
+        table = record.get('table') if isinstance(record, dict) else None
+        if table not in MODELS or not isinstance(record.get('row'), dict):
+            raise TransferError('Unknown table or missing row', number)
+        model, key = MODELS[table]
+        try:
+            row = decode_row(model, record['row'])
+        except ValueError as e:
+            raise TransferError(str(e), number)
+        if row.get(key) is None:
+            raise TransferError('Missing natural key %r' % key, number)
+        if table != pending_table or len(pending) >= BATCH_SIZE:
+            flush()
+            pending_table = table
+        pending.append(row)
+        pending_numbers.append(number)
+    flush()
+
+    reset_sequences(counts)
+    return counts
+
+def reset_sequences(tables):
+    # Postgres sequences don't advance for explicit ids
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    for table in tables:
+        db.session.execute(text(
+            "SELECT setval(pg_get_serial_sequence(:table, 'id'), COALESCE(MAX(id), 1)) FROM %s" % table
+        ), {'table': table})
@@ -0,0 +1,27 @@
+import argparse
+import logging
+import signal
+
+import jobs
+from app import create_app
+from config import Config
+
+class WorkerConfig(Config):
+    JOB_THREADS = 0  # this process runs jobs on its main thread
+
+# Background job worker: `python worker.py` next to the web process, against the
+# same DATABASE_URL. SIGTERM/SIGINT let the current job finish before exiting.
+def main():
+    parser = argparse.ArgumentParser(description='Run queued background jobs')
+    parser.add_argument('--once', action='store_true', help='exit when no job is due instead of polling')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    app = create_app(WorkerConfig)
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda signum, frame: jobs.stop())
+    app.logger.info('Job worker started, tasks: %s', ', '.join(sorted(jobs.TASKS)))
+    jobs.work(app, once=args.once)
+
+if __name__ == '__main__':
+    main()
@@ -9,18 +9,39 @@ const api = axios.create({
   },
 });
 
+// With read replicas, a write returns an X-Consistency-Token; sending it back for
+// a while keeps this tab's reads on a database that already has the write
+const CONSISTENCY_TTL_MS = 60 * 1000;
+
+const consistencyToken = () => {
+  const token = sessionStorage.getItem('consistencyToken');
+  const savedAt = Number(sessionStorage.getItem('consistencyTokenAt'));
+  return token && Date.now() - savedAt < CONSISTENCY_TTL_MS ? token : null;
+};
+
 // Add token to requests automatically
 api.interceptors.request.use((config) => {
   const token = localStorage.getItem('adminToken');
   if (token) {
     config.headers.Authorization = `Bearer ${token}`;
   }
+  const consistency = consistencyToken();
+  if (consistency) {
+    config.headers['X-Consistency-Token'] = consistency;
+  }
   return config;
 });
 
-// Handle 401 errors - clear token and redirect
+// Keep the latest consistency token; handle 401 errors - clear token and redirect
 api.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    const consistency = response.headers['x-consistency-token'];
+    if (consistency) {
+      sessionStorage.setItem('consistencyToken', consistency);
+      sessionStorage.setItem('consistencyTokenAt', String(Date.now()));
+    }
+    return response;
+  },
   (error) => {
     if (error.response?.status === 401) {
       localStorage.removeItem('adminToken');
@@ -47,8 +68,51 @@ export const checkAuth = () => api.get('/auth/check');
 
 export const isLoggedIn = () => !!localStorage.getItem('adminToken');
 
-export const changePassword = (currentPassword, newPassword) =>
-  api.post('/auth/change-password', { current_password: currentPassword, new_password: newPassword });
+// Public pages read prerendered JSON (written by the backend to SNAPSHOT_DIR) from
+// the CDN first and fall back to the API; signed-in admins always get live data
+const SNAPSHOT_URL = import.meta.env.VITE_SNAPSHOT_URL || '';
+
+const fromSnapshot = async (name, fallback) => {
+  if (SNAPSHOT_URL && !isLoggedIn()) {
+    try {
+      const { data } = await axios.get(`${SNAPSHOT_URL}/${name}.json`);
+      // SPA rewrites answer missing files with index.html
+      if (data && typeof data === 'object' && 'data' in data) {
+        return { data: data.data, headers: data.next_cursor ? { 'x-next-cursor': data.next_cursor } : {} };
+      }
+    } catch {
+      // Missing or unreachable snapshot: use the API
+    }
+  }
+  return fallback();
+};
+
+// Changing the password revokes existing tokens; keep the fresh one the server returns
+export const changePassword = async (currentPassword, newPassword) => {
+  const response = await api.post('/auth/change-password', { current_password: currentPassword, new_password: newPassword });
+  if (response.data.token) {
+    localStorage.setItem('adminToken', response.data.token);
+  }
+  return response;
+};
+
+// Paginated listings return the next page's cursor in the X-Next-Cursor header
+export const nextCursor = (response) => response.headers['x-next-cursor'] || null;
+
+// Follow X-Next-Cursor until the listing is exhausted
+export const fetchAllPages = async (fetchPage) => {
+  const items = [];
+  let cursor = null;
+  do {
+    const res = await fetchPage(cursor);
+    items.push(...res.data);
+    cursor = nextCursor(res);
+  } while (cursor);
+  return { data: items };
+};
+
+// Home (achievements, initiatives, workshops and alumni in one request)
+export const getHome = () => fromSnapshot('home', () => api.get('/home'));
 
 // Achievements
 export const getAchievements = () => api.get('/achievements');
@@ -75,14 +139,17 @@ export const updateAlumni = (id, data) => api.put(`/alumni/${id}`, data);
 export const deleteAlumni = (id) => api.delete(`/alumni/${id}`);
 
 // Projects
-export const getProjects = () => api.get('/projects');
+export const getProjects = () => fromSnapshot('projects', () => api.get('/projects'));
 export const createProject = (data) => api.post('/projects', data);
 export const updateProject = (id, data) => api.put(`/projects/${id}`, data);
 export const deleteProject = (id) => api.delete(`/projects/${id}`);
 
 // Blog
-export const getBlogPosts = (publishedOnly = true) => api.get(`/blog?published=${publishedOnly}`);
-export const getBlogPost = (id) => api.get(`/blog/${id}`);
+export const getBlogPosts = (publishedOnly = true, cursor = null) => {
+  const fetchPage = () => api.get('/blog', { params: { published: publishedOnly, ...(cursor && { cursor }) } });
+  return publishedOnly && !cursor ? fromSnapshot('blog', fetchPage) : fetchPage();
+};
+export const getBlogPost = (id) => fromSnapshot(`blog/${id}`, () => api.get(`/blog/${id}`));
 export const createBlogPost = (data) => api.post('/blog', data);
 export const updateBlogPost = (id, data) => api.put(`/blog/${id}`, data);
 export const deleteBlogPost = (id) => api.delete(`/blog/${id}`);
@@ -90,14 +157,78 @@ export const deleteBlogPost = (id) => api.delete(`/blog/${id}`);
 // Forum
 export const getForumCategories = () => api.get('/forum/categories');
 export const createForumCategory = (data) => api.post('/forum/categories', data);
-export const getForumPosts = (categoryId) => api.get(`/forum/posts${categoryId ? `?category_id=${categoryId}` : ''}`);
+export const getForumPosts = (categoryId, cursor = null) =>
+  api.get('/forum/posts', { params: { ...(categoryId && { category_id: categoryId }), ...(cursor && { cursor }) } });
 export const getForumPost = (id) => api.get(`/forum/posts/${id}`);
 export const createForumPost = (data) => api.post('/forum/posts', data);
 export const deleteForumPost = (id) => api.delete(`/forum/posts/${id}`);
 export const createForumReply = (postId, data) => api.post(`/forum/posts/${postId}/replies`, data);
 export const deleteForumReply = (id) => api.delete(`/forum/replies/${id}`);
 
-// Seed data
+// Live forum updates (Server-Sent Events); the browser resumes from Last-Event-ID on reconnect
+export const streamForum = (categoryId) =>
+  new EventSource(`${API_URL}/forum${categoryId ? `/categories/${categoryId}` : ''}/stream`);
+export const streamForumPost = (id) => new EventSource(`${API_URL}/forum/posts/${id}/stream`);
+
+// Batch create/update/delete in one transaction, e.g.
+// batchUpdate('alumni', [{ op: 'update', id: 3, data: { order: 1 } }, { op: 'delete', id: 7 }])
+export const batchUpdate = (resource, ops) => api.post(`/${resource}/batch`, { ops });
+
+// Uploads
+export const uploadFile = (file) => {
+  const form = new FormData();
+  form.append('file', file);
+  return api.post('/upload', form, { headers: { 'Content-Type': 'multipart/form-data' } });
+};
+
+// Chunked upload for large files; after a failed chunk it asks the server for the
+// current offset and continues from there. The file is verified by a background job;
+// resolves with { data: { url, filename, manifest } } like uploadFile
+export const uploadFileChunked = async (file, onProgress, maxRetries = 3) => {
+  const { data: session } = await api.post('/upload/sessions', { filename: file.name, size: file.size });
+  let offset = 0;
+  let failures = 0;
+  while (offset < file.size) {
+    const end = Math.min(offset + session.chunk_size, file.size);
+    try {
+      const res = await api.put(`/upload/sessions/${session.id}`, file.slice(offset, end), {
+        headers: {
+          'Content-Type': 'application/octet-stream',
+          'Content-Range': `bytes ${offset}-${end - 1}/${file.size}`,
+        },
+      });
+      offset = res.data.offset;
+      failures = 0;
+    } catch (error) {
+      if (++failures > maxRetries) throw error;
+      offset = (await api.get(`/upload/sessions/${session.id}`)).data.offset;
+    }
+    if (onProgress) onProgress(offset / file.size);
+  }
+  const { data } = await api.post(`/upload/sessions/${session.id}/complete`);
+  const job = await waitForJob(data.job.id);
+  if (job.status === 'failed') throw new Error(job.last_error.trim().split('\n').pop());
+  return { data: job.result };
+};
+
+// Search (snippets are HTML-escaped with matches wrapped in <mark>)
+export const searchContent = (q, page = 1) => api.get('/search', { params: { q, page } });
+
+// Background jobs: heavy work is queued and reported through /jobs/<id>
+export const getJob = (id) => api.get(`/jobs/${id}`);
+
+// Poll until the job is done or failed; resolves with the job, or rejects after timeoutMs
+export const waitForJob = async (id, { intervalMs = 1000, timeoutMs = 120000 } = {}) => {
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    const { data: job } = await getJob(id);
+    if (job.status === 'done' || job.status === 'failed') return job;
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+  throw new Error(`Job ${id} did not finish; is a job worker running?`);
+};
+
+// Seed data (queued as a background job)
 export const seedData = () => api.post('/seed');
 
 export default api;
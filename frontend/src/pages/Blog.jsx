@@ -1,16 +1,19 @@
 import { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
-import { getBlogPosts } from '../api';
+import { getBlogPosts, nextCursor } from '../api';
 
 function Blog() {
   const [posts, setPosts] = useState([]);
+  const [cursor, setCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     const fetchPosts = async () => {
       try {
         const res = await getBlogPosts();
         setPosts(res.data);
+        setCursor(nextCursor(res));
       } catch (error) {
         console.error('Error fetching blog posts:', error);
       } finally {
@@ -20,6 +23,19 @@ function Blog() {
     fetchPosts();
   }, []);
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await getBlogPosts(true, cursor);
+      setPosts([...posts, ...res.data]);
+      setCursor(nextCursor(res));
+    } catch (error) {
+      console.error('Error fetching blog posts:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleDateString('en-US', {
       year: 'numeric',
@@ -63,13 +79,20 @@ function Blog() {
                   <div className="blog-card-body">
                     <p className="blog-card-date">{formatDate(post.created_at)}</p>
                     <h3 className="blog-card-title">{post.title}</h3>
-                    <p className="blog-card-excerpt">{post.excerpt || post.content.substring(0, 150)}...</p>
+                    <p className="blog-card-excerpt">{post.excerpt}...</p>
                     {post.author && <p style={{ fontSize: '0.85rem', color: 'var(--color-5)' }}>By {post.author}</p>}
                   </div>
                 </Link>
               ))}
             </div>
           )}
+          {cursor && (
+            <div className="text-center" style={{ marginTop: '40px' }}>
+              <button className="btn btn-primary" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? 'Loading...' : 'Load More'}
+              </button>
+            </div>
+          )}
         </div>
       </section>
     </>
@@ -1,10 +1,12 @@
 import { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
-import { getForumCategories, getForumPosts, createForumPost } from '../api';
+import { getForumCategories, getForumPosts, createForumPost, nextCursor, streamForum } from '../api';
 
 function Forum() {
   const [categories, setCategories] = useState([]);
   const [posts, setPosts] = useState([]);
+  const [cursor, setCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedCategory, setSelectedCategory] = useState(null);
   const [showNewPost, setShowNewPost] = useState(false);
   const [newPost, setNewPost] = useState({ title: '', content: '', author_name: '', author_email: '', category_id: '' });
@@ -15,6 +17,16 @@ function Forum() {
     fetchData();
   }, []);
 
+  // New threads in the selected category appear without refetching the list
+  useEffect(() => {
+    const source = streamForum(selectedCategory);
+    source.addEventListener('post', (e) => {
+      const post = JSON.parse(e.data);
+      setPosts((prev) => (prev.some((p) => p.id === post.id) ? prev : [post, ...prev]));
+    });
+    return () => source.close();
+  }, [selectedCategory]);
+
   const fetchData = async () => {
     try {
       const [catRes, postRes] = await Promise.all([
@@ -23,6 +35,7 @@ function Forum() {
       ]);
       setCategories(catRes.data);
       setPosts(postRes.data);
+      setCursor(nextCursor(postRes));
     } catch (error) {
       console.error('Error fetching forum data:', error);
     } finally {
@@ -35,8 +48,22 @@ function Forum() {
     try {
       const res = await getForumPosts(categoryId);
       setPosts(res.data);
+      setCursor(nextCursor(res));
+    } catch (error) {
+      console.error('Error fetching posts:', error);
+    }
+  };
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await getForumPosts(selectedCategory, cursor);
+      setPosts([...posts, ...res.data]);
+      setCursor(nextCursor(res));
     } catch (error) {
       console.error('Error fetching posts:', error);
+    } finally {
+      setLoadingMore(false);
     }
   };
 
@@ -197,6 +224,13 @@ function Forum() {
                   </p>
                 </Link>
               ))}
+              {cursor && (
+                <div className="text-center" style={{ marginTop: '30px' }}>
+                  <button className="btn btn-primary" onClick={loadMore} disabled={loadingMore}>
+                    {loadingMore ? 'Loading...' : 'Load More'}
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </div>
@@ -1,6 +1,6 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useParams, Link } from 'react-router-dom';
-import { getForumPost, createForumReply } from '../api';
+import { getForumPost, createForumReply, streamForumPost } from '../api';
 
 function ForumPost() {
   const { id } = useParams();
@@ -8,15 +8,35 @@ function ForumPost() {
   const [loading, setLoading] = useState(true);
   const [reply, setReply] = useState({ content: '', author_name: '', author_email: '' });
   const [submitting, setSubmitting] = useState(false);
+  // Replies pushed before the initial fetch resolves
+  const pendingReplies = useRef([]);
 
   useEffect(() => {
+    // Subscribe before fetching so no reply falls between the two
+    pendingReplies.current = [];
+    const source = streamForumPost(id);
+    source.addEventListener('reply', (e) => addReplies([JSON.parse(e.data)]));
     fetchPost();
+    return () => source.close();
   }, [id]);
 
+  const addReplies = (replies) => {
+    setPost((prev) => {
+      if (!prev) {
+        pendingReplies.current.push(...replies);
+        return prev;
+      }
+      const known = new Set(prev.replies.map((r) => r.id));
+      const added = replies.filter((r) => !known.has(r.id));
+      return added.length ? { ...prev, replies: [...prev.replies, ...added] } : prev;
+    });
+  };
+
   const fetchPost = async () => {
     try {
       const res = await getForumPost(id);
       setPost(res.data);
+      addReplies(pendingReplies.current.splice(0));
     } catch (error) {
       console.error('Error fetching post:', error);
     } finally {
@@ -28,9 +48,9 @@ function ForumPost() {
     e.preventDefault();
     setSubmitting(true);
     try {
-      await createForumReply(id, reply);
+      const res = await createForumReply(id, reply);
       setReply({ content: '', author_name: '', author_email: '' });
-      fetchPost();
+      addReplies([res.data]);
     } catch (error) {
       console.error('Error creating reply:', error);
     } finally {
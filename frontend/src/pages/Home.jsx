@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import { getAchievements, getInitiatives, getWorkshops, getAlumni } from '../api';
+import { getHome } from '../api';
 
 function Home() {
   const [achievements, setAchievements] = useState([]);
@@ -11,16 +11,11 @@ function Home() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [achRes, initRes, workRes, alumRes] = await Promise.all([
-          getAchievements(),
-          getInitiatives(),
-          getWorkshops(),
-          getAlumni()
-        ]);
-        setAchievements(achRes.data);
-        setInitiatives(initRes.data);
-        setWorkshops(workRes.data);
-        setAlumni(alumRes.data);
+        const res = await getHome();
+        setAchievements(res.data.achievements);
+        setInitiatives(res.data.initiatives);
+        setWorkshops(res.data.workshops);
+        setAlumni(res.data.alumni);
       } catch (error) {
         console.error('Error fetching data:', error);
         // Use fallback data if API fails
@@ -1,14 +1,14 @@
 import { useState, useEffect } from 'react';
 import { Routes, Route, NavLink, useNavigate } from 'react-router-dom';
 import {
-  checkAuth, logout, seedData, isLoggedIn,
+  checkAuth, logout, seedData, waitForJob, isLoggedIn,
   getAchievements, createAchievement, updateAchievement, deleteAchievement,
   getInitiatives, createInitiative, updateInitiative, deleteInitiative,
   getWorkshops, createWorkshop, updateWorkshop, deleteWorkshop,
   getAlumni, createAlumni, updateAlumni, deleteAlumni,
   getProjects, createProject, updateProject, deleteProject,
-  getBlogPosts, createBlogPost, updateBlogPost, deleteBlogPost,
-  getForumPosts, deleteForumPost
+  getBlogPosts, getBlogPost, createBlogPost, updateBlogPost, deleteBlogPost,
+  getForumPosts, deleteForumPost, fetchAllPages
 } from '../../api';
 
 function Dashboard() {
@@ -53,7 +53,9 @@ function Dashboard() {
 
   const handleSeedData = async () => {
     try {
-      await seedData();
+      const res = await seedData();
+      const job = await waitForJob(res.data.job.id);
+      if (job.status === 'failed') throw new Error(job.last_error);
       alert('Data seeded successfully!');
       window.location.reload();
     } catch (error) {
@@ -103,7 +105,7 @@ function Dashboard() {
           <Route path="dashboard/workshops" element={<CrudPage title="Workshops" fetchFn={getWorkshops} createFn={createWorkshop} updateFn={updateWorkshop} deleteFn={deleteWorkshop} fields={workshopFields} />} />
           <Route path="dashboard/alumni" element={<CrudPage title="Alumni" fetchFn={getAlumni} createFn={createAlumni} updateFn={updateAlumni} deleteFn={deleteAlumni} fields={alumniFields} />} />
           <Route path="dashboard/projects" element={<CrudPage title="Projects" fetchFn={getProjects} createFn={createProject} updateFn={updateProject} deleteFn={deleteProject} fields={projectFields} />} />
-          <Route path="dashboard/blog" element={<CrudPage title="Blog Posts" fetchFn={() => getBlogPosts(false)} createFn={createBlogPost} updateFn={updateBlogPost} deleteFn={deleteBlogPost} fields={blogFields} />} />
+          <Route path="dashboard/blog" element={<CrudPage title="Blog Posts" fetchFn={() => fetchAllPages((cursor) => getBlogPosts(false, cursor))} fetchOneFn={getBlogPost} createFn={createBlogPost} updateFn={updateBlogPost} deleteFn={deleteBlogPost} fields={blogFields} />} />
           <Route path="dashboard/forum" element={<ForumAdmin />} />
         </Routes>
       </main>
@@ -139,7 +141,7 @@ function DashboardHome({ onSeedData }) {
   );
 }
 
-function CrudPage({ title, fetchFn, createFn, updateFn, deleteFn, fields }) {
+function CrudPage({ title, fetchFn, fetchOneFn, createFn, updateFn, deleteFn, fields }) {
   const [items, setItems] = useState([]);
   const [loading, setLoading] = useState(true);
   const [showModal, setShowModal] = useState(false);
@@ -167,7 +169,16 @@ function CrudPage({ title, fetchFn, createFn, updateFn, deleteFn, fields }) {
     setShowModal(true);
   };
 
-  const openEdit = (item) => {
+  const openEdit = async (item) => {
+    // Listings may be summaries; load the full record before editing
+    if (fetchOneFn) {
+      try {
+        item = (await fetchOneFn(item.id)).data;
+      } catch (error) {
+        console.error('Fetch error:', error);
+        return;
+      }
+    }
     setEditItem(item);
     setFormData(fields.reduce((acc, f) => ({ ...acc, [f.name]: item[f.name] || '' }), {}));
     setShowModal(true);
@@ -306,7 +317,7 @@ function ForumAdmin() {
 
   const fetchPosts = async () => {
     try {
-      const res = await getForumPosts();
+      const res = await fetchAllPages((cursor) => getForumPosts(null, cursor));
       setPosts(res.data);
     } catch (error) {
       console.error('Fetch error:', error);